@@ -0,0 +1,114 @@
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.link import TCLink
+from mininet.node import RemoteController
+from mininet.log import setLogLevel
+import time
+import argparse
+import hashlib
+
+# Loss/delay grid for the congestion-controlled servers, one CSV per
+# algorithm in the same format as p2_loss.csv / p3_delay.csv, so reno,
+# cubic and bbr can be compared point by point.
+# Run from a directory holding p2_server.py, p2_client.py and sending_file.txt.
+
+
+class CustomTopo(Topo):
+    def build(self, loss, delay):
+        # Add two hosts
+        h1 = self.addHost('h1')
+        h2 = self.addHost('h2')
+
+        # Add a single switch
+        s1 = self.addSwitch('s1')
+
+        # Link between h1 and s1 with the specified packet loss and delay
+        self.addLink(h1, s1, loss=loss, delay=f'{delay}ms')
+
+        # Link between h2 and s1 with no packet loss
+        self.addLink(h2, s1, loss=0)
+
+
+def compute_md5(file_path):
+    """Compute the MD5 hash of a file."""
+    hasher = hashlib.md5()
+    try:
+        with open(file_path, 'rb') as file:
+            # Read the file in chunks to avoid using too much memory for large files
+            while chunk := file.read(8192):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+    except FileNotFoundError:
+        print(f"File not found: {file_path}")
+        return None
+
+
+def run(expname, algorithms, iterations):
+    # Set the log level to info to see detailed output
+    setLogLevel('info')
+
+    # IP and port of the remote controller
+    controller_ip = '127.0.0.1'  # Change to the controller's IP address if not local
+    controller_port = 6653       # Default OpenFlow controller port
+
+    SERVER_IP = "10.0.0.1"
+    SERVER_PORT = 6555
+    OUTFILE = 'received_file.txt'
+    md5_hash_sent = compute_md5('sending_file.txt')
+
+    delay_list, loss_list = [], []
+    if expname == "loss":
+        loss_list = [x * 0.5 for x in range(0, 10)]
+        delay_list = [20]
+    elif expname == "delay":
+        delay_list = [x for x in range(0, 201, 20)]
+        loss_list = [1]
+
+    outputs = {}
+    for CC in algorithms:
+        outputs[CC] = open(f'{CC}_{expname}.csv', 'a')
+        if outputs[CC].tell() == 0:
+            outputs[CC].write("loss,delay,md5_hash_sent,md5_hash,ttc\n")
+
+    for DELAY in delay_list:
+        for LOSS in loss_list:
+            for _ in range(iterations):
+                for CC in algorithms:
+                    print(f"\n--- Running {CC} with {LOSS}% packet loss and {DELAY}ms delay")
+
+                    topo = CustomTopo(loss=LOSS, delay=DELAY)
+                    net = Mininet(topo=topo, link=TCLink, controller=None)
+                    remote_controller = RemoteController('c0', ip=controller_ip, port=controller_port)
+                    net.addController(remote_controller)
+                    net.start()
+
+                    h1 = net.get('h1')
+                    h2 = net.get('h2')
+
+                    h1.cmd(f"python3 p2_server.py {SERVER_IP} {SERVER_PORT} --cc {CC} &")
+                    time.sleep(0.5)
+                    start_time = time.time()
+                    h2.cmd(f"python3 p2_client.py {SERVER_IP} {SERVER_PORT} --pref_outfile {OUTFILE}")
+                    ttc = time.time() - start_time
+
+                    md5_hash = compute_md5(OUTFILE)
+                    outputs[CC].write(f"{LOSS},{DELAY},{md5_hash_sent},{md5_hash},{ttc}\n")
+                    outputs[CC].flush()
+
+                    net.stop()
+                    # Wait a moment before starting the next iteration
+                    time.sleep(1)
+
+    for f_out in outputs.values():
+        f_out.close()
+    print("\n--- Completed all tests ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loss/delay grid across congestion controllers.")
+    parser.add_argument("expname", choices=["loss", "delay"])
+    parser.add_argument("--cc", nargs="+", default=["reno", "cubic", "bbr"],
+                        help="Algorithms to compare (default: reno cubic bbr)")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+    run(args.expname, args.cc, args.iterations)
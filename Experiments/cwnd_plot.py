@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cc.trace import trace_frames
+
+# cwnd and ssthresh over time, one subplot per connection, from a trace
+# recorded with --trace on p2_server.py or p3_server.py. A binary trace
+# (--trace trace.bin) barely slows the transfer down, unlike the logging
+# lines this replaces.
+
+parser = argparse.ArgumentParser(description="Plot the congestion window from a server trace.")
+parser.add_argument("trace", help="CSV or .bin trace written by --trace")
+parser.add_argument("--output", default="cwnd_plot.png", help="Image to write")
+args = parser.parse_args()
+
+frames = trace_frames(args.trace)
+plt.figure(figsize=(12, 4 * len(frames)))
+
+for i, (conn, data) in enumerate(frames.items()):
+    mss = data["mss"].iloc[0]
+    plt.subplot(len(frames), 1, i + 1)
+    plt.plot(data["elapsed"], data["cwnd"] / mss, label="cwnd", color="b")
+    # ssthresh starts out unbounded
+    finite = data[data["ssthresh"] != float("inf")]
+    plt.plot(finite["elapsed"], finite["ssthresh"] / mss, label="ssthresh", color="r", linestyle="--")
+    for event, marker in (("loss", "x"), ("timeout", "o")):
+        events = data[data["event"] == event]
+        plt.scatter(events["elapsed"], events["cwnd"] / mss, label=event, marker=marker, color="k")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Segments")
+    plt.title(f"Congestion window of {conn} ({data['cc'].iloc[0]})")
+    plt.legend()
+    plt.grid(True)
+
+plt.tight_layout()
+plt.savefig(args.output)
+plt.close()
@@ -0,0 +1,295 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from netem import Emulator, Route, link_pair
+
+# Loss, delay and fairness sweeps over the userspace emulator in netem.py,
+# so they run on any Linux box without Mininet. A JSON config (see
+# configs/) names the part to run, the grid to sweep and the links, and
+# every random impairment is seeded from the config, the grid point and the
+# iteration, so a sweep is reproducible.
+#
+# Grid keys that are Link parameters (loss, delay, jitter, reorder,
+# bandwidth, queue) override the config's "link". A fairness sweep runs two
+# flows through a shared "bottleneck", the first over "link" and the second
+# over "second_link"; grid keys apply to the second only, and a grid delay
+# is added to its own, like delay_sw2_s2 in p2_exp_fairness.py.
+# Every grid key can also be used in "server_args" and "client_args", as in
+# "{fast_recovery}". One CSV row per run: the grid point and iteration,
+# then the results in the format the plotting scripts read.
+#
+# Runs are independent, so --jobs runs several at once, each pool worker
+# on its own block of ports. A run that times out or crashes is tried
+# again, up to --retries times. Every row is written as soon as its run
+# finishes, and running a sweep again skips the runs its CSV already
+# holds results for, so an interrupted sweep picks up where it stopped and
+# the runs that failed every attempt are tried again.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HOST = "127.0.0.1"
+LINK_PARAMS = ("loss", "delay", "jitter", "reorder", "bandwidth", "queue")
+OUTFILE = "received_file.txt"
+STARTUP = 0.5  # Seconds a server gets to bind before its client starts
+PORTS_PER_RUN = 4  # Enough for a fairness run: two servers and their relays
+
+DEFAULTS = {
+    "experiment": "transfer",
+    "server_args": [],
+    "client_args": [],
+    "grid": {},
+    "link": {},
+    "bottleneck": {},
+    "iterations": 1,
+    "seed": 0,
+    "timeout": 300,
+    "base_port": 20000,
+}
+
+
+def load_config(path):
+    with open(path) as f:
+        config = {**DEFAULTS, **json.load(f)}
+    config["part"] = os.path.join(ROOT, config["part"])
+    config["file"] = os.path.join(ROOT, config.get("file") or os.path.join(config["part"], "sending_file.txt"))
+    return config
+
+
+def grid_points(config):
+    names = list(config["grid"])
+    return [dict(zip(names, values)) for values in itertools.product(*config["grid"].values())]
+
+
+def compute_md5(file_path):
+    """Compute the MD5 hash of a file."""
+    hasher = hashlib.md5()
+    try:
+        with open(file_path, "rb") as file:
+            while chunk := file.read(8192):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def jain_fairness_index(allocations):
+    n = len(allocations)
+    return sum(allocations) ** 2 / (n * sum(x ** 2 for x in allocations))
+
+
+def header(config):
+    if config["experiment"] == "fairness":
+        results = ["md5_hash_1", "md5_hash_2", "ttc1", "ttc2", "jfi"]
+    else:
+        results = ["md5_hash_sent", "md5_hash", "ttc"]
+    return list(config["grid"]) + ["iteration"] + results
+
+
+def link_params(config, point):
+    return {**config["link"], **{k: v for k, v in point.items() if k in LINK_PARAMS}}
+
+
+def second_link_params(config, point):
+    base = config.get("second_link", config["link"])
+    params = {**base, **{k: v for k, v in point.items() if k in LINK_PARAMS}}
+    params["delay"] = base.get("delay", 0) + point.get("delay", 0)
+    return params
+
+
+def command(config, script, port, args, point):
+    return [sys.executable, os.path.join(config["part"], config[script]), HOST, str(port)] + [
+        str(arg).format(**point) for arg in config[args]
+    ]
+
+
+def stop(process):
+    """Give a server a moment to finish on its own, then kill it."""
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def wait_all(clients, timeout):
+    """Completion time of every client process, or None if it timed out."""
+    start = time.time()
+    ttcs = [None] * len(clients)
+    while any(ttc is None for ttc in ttcs) and time.time() - start < timeout:
+        for i, client in enumerate(clients):
+            if ttcs[i] is None and client.poll() is not None:
+                ttcs[i] = time.time() - start
+        time.sleep(0.01)
+    for client in clients:
+        if client.poll() is None:
+            client.kill()
+            client.wait()
+    return ttcs
+
+
+def run_transfer(config, point, seed, port, workdir):
+    """One client fetching the file through one emulated link."""
+    up, down = link_pair(link_params(config, point), seed)
+    emulator = Emulator([Route(port + 1, port, [up], [down])]).start()
+    server = subprocess.Popen(command(config, "server", port, "server_args", point), cwd=workdir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(STARTUP)
+        client = subprocess.Popen(command(config, "client", port + 1, "client_args", point), cwd=workdir,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        (ttc,) = wait_all([client], config["timeout"])
+    finally:
+        stop(server)
+        emulator.stop()
+    md5_hash = compute_md5(os.path.join(workdir, OUTFILE)) if ttc is not None else None
+    return [compute_md5(config["file"]), md5_hash, ttc]
+
+
+def run_fairness(config, point, seed, port, workdir):
+    """Two flows sharing a bottleneck, the second over a longer path,
+    like the dumbbell of p2_exp_fairness.py."""
+    bottleneck = link_pair(config["bottleneck"], f"{seed}:bottleneck")
+    flows = [link_pair(config["link"], f"{seed}:1"), link_pair(second_link_params(config, point), f"{seed}:2")]
+    routes = []
+    for i, (up, down) in enumerate(flows):
+        # Server i on port + i, its relay on port + 2 + i
+        routes.append(Route(port + 2 + i, port + i, [up, bottleneck[0]], [bottleneck[1], down]))
+    emulator = Emulator(routes).start()
+    servers, clients = [], []
+    try:
+        for i in range(2):
+            os.makedirs(os.path.join(workdir, str(i)))
+            shutil.copy(os.path.join(workdir, "sending_file.txt"), os.path.join(workdir, str(i)))
+            servers.append(subprocess.Popen(command(config, "server", port + i, "server_args", point),
+                                            cwd=os.path.join(workdir, str(i)),
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        time.sleep(STARTUP)
+        for i in range(2):
+            clients.append(subprocess.Popen(command(config, "client", port + 2 + i, "client_args", point),
+                                            cwd=os.path.join(workdir, str(i)),
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        ttcs = wait_all(clients, config["timeout"])
+    finally:
+        for server in servers:
+            stop(server)
+        emulator.stop()
+    hashes = [compute_md5(os.path.join(workdir, str(i), OUTFILE)) for i in range(2)]
+    jfi = jain_fairness_index([1 / ttc for ttc in ttcs]) if None not in ttcs else None
+    return hashes + ttcs + [jfi]
+
+
+def run_point(config, point, iteration, port):
+    """Run one grid point in a scratch directory; return its CSV row."""
+    seed = f"{config['seed']}:{json.dumps(point, sort_keys=True)}:{iteration}"
+    workdir = tempfile.mkdtemp(prefix="emu_")
+    try:
+        shutil.copy(config["file"], os.path.join(workdir, "sending_file.txt"))
+        run = run_fairness if config["experiment"] == "fairness" else run_transfer
+        return list(point.values()) + [iteration] + run(config, point, seed, port, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+worker_port = None  # First port of this pool worker's block
+
+
+def init_worker(base_port, counter):
+    global worker_port
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    worker_port = base_port + slot * PORTS_PER_RUN
+
+
+def run_with_retries(config, point, iteration, retries):
+    """Run one grid point, again if it times out or crashes; a run that
+    never succeeds is recorded with its results left empty."""
+    row = list(point.values()) + [iteration]
+    row += [None] * (len(header(config)) - len(row))
+    for attempt in range(retries + 1):
+        print(f"\n--- Running {point}, iteration {iteration}, attempt {attempt + 1}")
+        try:
+            row = run_point(config, point, iteration, worker_port)
+        except Exception:
+            traceback.print_exc()
+            continue
+        if None not in row:
+            break
+    return row
+
+
+def star_run_with_retries(args):
+    return run_with_retries(*args)
+
+
+def completed_runs(output_file, columns, names):
+    """Grid points and iterations an earlier run of the sweep recorded
+    results for. Rows a failed run left empty (or an interrupted one cut
+    short) are removed from the CSV, so that their retry replaces them
+    instead of adding a second row for the same run."""
+    if not os.path.exists(output_file):
+        return set()
+    with open(output_file, newline="") as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return set()
+    if rows[0] != columns:
+        sys.exit(f"{output_file} holds another sweep's columns, choose another output")
+    complete = [row for row in rows[1:] if len(row) == len(columns) and "" not in row]
+    if len(complete) < len(rows) - 1:
+        with open(output_file, "w", newline="") as f:
+            csv.writer(f).writerows([columns] + complete)
+    return {tuple(row[: len(names) + 1]) for row in complete}
+
+
+def run(config_path, jobs=1, retries=1):
+    config = load_config(config_path)
+    output_file = config["output"]
+    columns = header(config)
+    done = completed_runs(output_file, columns, list(config["grid"]))
+    runs = [
+        (config, point, iteration, retries)
+        for point in grid_points(config)
+        for iteration in range(config["iterations"])
+        if tuple(str(v) for v in point.values()) + (str(iteration),) not in done
+    ]
+    print(f"{len(runs)} runs to go, {len(done)} already recorded in {output_file}")
+    if jobs * 3 > os.cpu_count():
+        # A server, a client and a relay per run: beyond that, completion
+        # times include waiting for a CPU
+        print(f"Warning: {jobs} runs at once oversubscribe {os.cpu_count()} CPUs")
+
+    f_out = open(output_file, "a", newline="")
+    writer = csv.writer(f_out)
+    if f_out.tell() == 0:
+        writer.writerow(columns)
+    counter = multiprocessing.Value("i", 0)
+    with multiprocessing.Pool(jobs, init_worker, (config["base_port"], counter)) as pool:
+        for row in pool.imap_unordered(star_run_with_retries, runs):
+            print(row)
+            writer.writerow(row)
+            f_out.flush()
+
+    f_out.close()
+    print("\n--- Completed all tests ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loss/delay/fairness sweeps over the userspace emulator.")
+    parser.add_argument("config", help="JSON sweep configuration, e.g. configs/p2_loss.json")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Runs at once; each takes a server, a client and a relay (default 1)")
+    parser.add_argument("--retries", type=int, default=1,
+                        help="Times to rerun a run that timed out or crashed (default 1)")
+    args = parser.parse_args()
+    run(args.config, args.jobs, args.retries)
@@ -0,0 +1,202 @@
+import argparse
+import collections
+import heapq
+import itertools
+import random
+import select
+import socket
+import threading
+import time
+
+# Userspace stand-in for the Mininet TCLinks of the experiments: a UDP
+# relay on localhost that impairs every datagram passing through it, so the
+# sweeps need neither root, Open vSwitch nor a controller. Point a client
+# at the relay's listening port and the relay forwards to the server.
+
+IP_UDP_OVERHEAD = 28  # Headers a real link would carry, counted against bandwidth
+RECV_SIZE = 65536
+TICK = 0.05  # Longest the relay sleeps before checking whether to stop
+
+
+class Link:
+    """One direction of an emulated link, with netem-style impairments.
+
+    Each datagram is lost with probability ``loss`` percent, then waits in
+    a drop-tail queue of ``queue`` packets (0 for no limit) drained at
+    ``bandwidth`` Mbit/s (0 for no limit), then takes ``delay`` ms plus up
+    to ``jitter`` ms either way to cross. ``reorder`` percent of datagrams
+    skip the delay and overtake those in flight, as with netem's reorder.
+    """
+
+    def __init__(self, loss=0, delay=0, jitter=0, reorder=0, bandwidth=0, queue=0, rng=None):
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.bandwidth = bandwidth
+        self.queue = queue
+        self.rng = rng if rng is not None else random.Random()
+        self.free_at = 0.0  # When the link has serialised everything queued
+        self.departures = collections.deque()  # Of the datagrams still queued
+        self.dropped = 0
+        self.overflowed = 0
+
+    def transit(self, size, now):
+        """Time a datagram of ``size`` bytes sent at ``now`` reaches the far
+        end, or None if the link drops it. Calls must come in time order."""
+        if self.loss and self.rng.random() * 100 < self.loss:
+            self.dropped += 1
+            return None
+        if self.bandwidth:
+            while self.departures and self.departures[0] <= now:
+                self.departures.popleft()
+            if self.queue and len(self.departures) >= self.queue:
+                self.overflowed += 1
+                return None
+            self.free_at = max(now, self.free_at) + (size + IP_UDP_OVERHEAD) * 8 / (self.bandwidth * 1e6)
+            self.departures.append(self.free_at)
+            now = self.free_at
+        if self.reorder and self.rng.random() * 100 < self.reorder:
+            return now
+        delay = self.delay
+        if self.jitter:
+            delay += self.rng.uniform(-self.jitter, self.jitter)
+        return now + max(0.0, delay) / 1000
+
+
+class Route:
+    """Clients of ``listen_port`` relayed to the server on ``target_port``.
+
+    ``up`` is the chain of Links towards the server and ``down`` the chain
+    back. A Link may appear in the chains of several routes, which then
+    share it like flows sharing a bottleneck. ``tap(upstream, data)``, if
+    given, sees every datagram as it enters the route.
+    """
+
+    def __init__(self, listen_port, target_port, up=(), down=(), host="127.0.0.1", tap=None):
+        self.listen_port = listen_port
+        self.tap = tap
+        self.target = (host, target_port)
+        self.host = host
+        self.up = list(up)
+        self.down = list(down)
+
+
+class Emulator:
+    """Runs any number of Routes from one select loop, in a thread or not."""
+
+    def __init__(self, routes):
+        self.listeners = {}  # Listening socket -> its route
+        for route in routes:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((route.host, route.listen_port))
+            self.listeners[sock] = route
+        self.upstreams = {}  # (listening socket, client address) -> socket to the server
+        self.clients = {}  # Socket to the server -> (listening socket, client address)
+        self.events = []  # Heap of datagrams crossing a link
+        self.counter = itertools.count()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def upstream(self, listener, client_address):
+        """Socket towards the server for one client, so the server sees
+        each client at its own address."""
+        sock = self.upstreams.get((listener, client_address))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect(self.listeners[listener].target)
+            self.upstreams[(listener, client_address)] = sock
+            self.clients[sock] = (listener, client_address)
+        return sock
+
+    def forward(self, data, chain, hop, send, now):
+        """Pass a datagram through ``chain`` from ``hop`` on, deliver it with
+        ``send`` once it is through; each hop is entered at its own time."""
+        while hop < len(chain):
+            arrival = chain[hop].transit(len(data), now)
+            if arrival is None:
+                return
+            hop += 1
+            if arrival > now:
+                heapq.heappush(self.events, (arrival, next(self.counter), data, chain, hop, send))
+                return
+        try:
+            send(data)
+        except OSError:
+            # The receiving end has gone away, as on a real network
+            pass
+
+    def receive(self, sock, now):
+        try:
+            data, address = sock.recvfrom(RECV_SIZE)
+        except OSError:
+            # ICMP port unreachable from a server that has exited
+            return
+        if sock in self.listeners:
+            route = self.listeners[sock]
+            if route.tap is not None:
+                route.tap(True, data)
+            self.forward(data, route.up, 0, self.upstream(sock, address).send, now)
+        else:
+            listener, client_address = self.clients[sock]
+            route = self.listeners[listener]
+            if route.tap is not None:
+                route.tap(False, data)
+            send = lambda d, listener=listener, a=client_address: listener.sendto(d, a)
+            self.forward(data, route.down, 0, send, now)
+
+    def run(self):
+        while not self.stopped.is_set():
+            timeout = TICK
+            if self.events:
+                timeout = min(TICK, max(0.0, self.events[0][0] - time.monotonic()))
+            sockets = list(self.listeners) + list(self.clients)
+            readable, _, _ = select.select(sockets, [], [], timeout)
+            now = time.monotonic()
+            for sock in readable:
+                self.receive(sock, now)
+            while self.events and self.events[0][0] <= now:
+                arrival, _, data, chain, hop, send = heapq.heappop(self.events)
+                self.forward(data, chain, hop, send, arrival)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        for sock in list(self.listeners) + list(self.clients):
+            sock.close()
+
+
+def link_pair(params, seed):
+    """Links for both directions of one emulated cable, each with its own
+    reproducible random stream."""
+    return (Link(**params, rng=random.Random(f"{seed}:up")),
+            Link(**params, rng=random.Random(f"{seed}:down")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relay UDP on localhost through an emulated link.")
+    parser.add_argument("listen_port", type=int, help="Port clients connect to")
+    parser.add_argument("target_port", type=int, help="Port of the server behind the link")
+    parser.add_argument("--loss", type=float, default=0, help="Loss in percent, each way")
+    parser.add_argument("--delay", type=float, default=0, help="One-way delay in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Delay variation in ms, either way")
+    parser.add_argument("--reorder", type=float, default=0, help="Percent of packets that skip the delay")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Mbit/s, 0 for unlimited")
+    parser.add_argument("--queue", type=int, default=0, help="Drop-tail queue in packets, 0 for unbounded")
+    parser.add_argument("--seed", default="0", help="Seed of the random impairments")
+    args = parser.parse_args()
+    params = dict(loss=args.loss, delay=args.delay, jitter=args.jitter, reorder=args.reorder,
+                  bandwidth=args.bandwidth, queue=args.queue)
+    up, down = link_pair(params, args.seed)
+    emulator = Emulator([Route(args.listen_port, args.target_port, [up], [down])])
+    try:
+        emulator.run()
+    except KeyboardInterrupt:
+        pass
+    print(f"dropped {up.dropped + down.dropped} at random, {up.overflowed + down.overflowed} at the queue")
@@ -1,9 +1,18 @@
+import heapq
 import socket
 import time
 import argparse
 import logging
-import json
-import time
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.handshake import IDLE_TIMEOUT
+from common.packet import FLAG_END, FLAG_START, START_INFO, parse_packet, send_packet
+from common.rtt import RTTManager
+from common.server import serve
+from common.source import FileSource
+from common.timers import RetransmitTimers
 
 MSS = 1400
 TIMEOUT = 0.0465
@@ -19,180 +28,263 @@ WINDOW_SIZE = 6
 # )
 
 
-class RTTManager:
+class RetransmitStats:
+    """Retransmission counters shared by every transfer of one server run.
+
+    ``time_saved`` adds up how much of each segment's RTO was still left
+    when fast retransmit resent it, i.e. how much sooner it went out than a
+    timeout would have sent it.
+    """
+
     def __init__(self):
-        # Initial values
-        self.srtt = None  # Smoothed Round Trip Time
-        self.rttvar = None  # Round Trip Time Variation
-        self.rto = 1.0  # Initial RTO of 1 second
-
-        # Constants for RTT calculation (as per RFC 6298)
-        self.ALPHA = 0.125  # Smoothing factor for SRTT
-        self.BETA = 0.25  # Smoothing factor for RTTVAR
-        self.K = 4  # Factor for RTO calculation
-        self.MIN_RTO = 0.2  # Minimum RTO value (200ms)
-        self.MAX_RTO = 60  # Maximum RTO value (60 seconds)
-
-    def update_rtt(self, measured_rtt):
-        """Update SRTT, RTTVAR, and RTO based on new RTT measurement"""
-        if self.srtt is None:
-            # First RTT measurement
-            self.srtt = measured_rtt
-            self.rttvar = measured_rtt / 2
+        self.fast_retransmits = 0
+        self.timeout_retransmits = 0
+        self.recoveries = 0  # Fast retransmits later covered by an ACK
+        self.recovery_time = 0.0  # Fast retransmit to that ACK, summed
+        self.time_saved = 0.0
+
+    def mean_recovery(self):
+        return self.recovery_time / self.recoveries if self.recoveries else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.fast_retransmits} fast and {self.timeout_retransmits} timeout "
+            f"retransmissions, mean fast recovery {self.mean_recovery():.4f}s, "
+            f"{self.time_saved:.4f}s of RTO saved"
+        )
+
+
+class ReliableTransfer:
+    """Sender state for one client, driven by the shared serve() loop."""
+
+    def __init__(self, server_socket, client_address, source, fast_recovery, stats):
+        self.server_socket = server_socket
+        self.client_address = client_address
+        self.source = source
+        self.fast_recovery = fast_recovery
+        self.stats = stats
+        self.rtt_manager = RTTManager()  # Create RTT manager instance
+
+        self.max_seq = source.end_seq(MSS)
+        # One byte per segment, indexed by seq // MSS
+        self.acked = bytearray(self.max_seq // MSS)
+        self.outstanding = len(self.acked)  # Segments not ACKed yet
+
+        self.base_seq = 0
+        self.next_seq = 0  # One past the highest segment sent so far
+        self.packet_times = {}
+        self.timers = RetransmitTimers()  # Per-segment retransmission deadlines
+        self.lost = []  # Heap of segments waiting to be retransmitted
+        self.retransmitted = set()  # Sent more than once, so never RTT samples
+        self.fast_sent = {}  # seq -> when fast retransmit resent it
+        self.dup_acks = 0
+        self.last_event_time = time.monotonic()
+        self.last_heard = self.last_event_time  # Any datagram from the client
+        self.last_timeout = 0.0
+        self.done = False
+
+    def send_start_info(self):
+        # Announce the file size so the client can preallocate its output
+        send_packet(
+            self.server_socket,
+            self.client_address,
+            0,
+            START_INFO.pack(self.source.size),
+            start=True,
+        )
+
+    def start(self, packet):
+        self.send_start_info()
+        self.send_window()
+
+    def send_window(self):
+        base_seq, max_seq = self.base_seq, self.max_seq
+        window_end = min(max_seq + MSS, base_seq + WINDOW_SIZE * MSS + MSS)
+        now = time.monotonic()
+
+        # Expired segments first; entries ACKed or resent since are dropped
+        while self.lost and self.lost[0] < window_end:
+            seq_num = heapq.heappop(self.lost)
+            if seq_num < self.base_seq or seq_num in self.timers:
+                continue
+            if not self.transmit(seq_num, now):
+                heapq.heappush(self.lost, seq_num)
+                break
+            self.stats.timeout_retransmits += 1
+        while self.next_seq < window_end:
+            if not self.transmit(self.next_seq, now):
+                break
+            self.next_seq += MSS
+
+    def transmit(self, seq_num, now):
+        """Send one segment and arm its timer; False if END must wait."""
+        if seq_num == self.max_seq:
+            # send_packet(self.server_socket, self.client_address, seq_num, end=True)
+            if self.outstanding == 0:
+                send_packet(self.server_socket, self.client_address, seq_num, end=True)
+            else:
+                # logging.info("Caught here")
+                return False
         else:
-            # Update RTTVAR and SRTT as per Jacobson's algorithm
-            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(
-                self.srtt - measured_rtt
+            send_packet(
+                self.server_socket,
+                self.client_address,
+                seq_num,
+                self.source.segment(seq_num, MSS),
             )
-            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * measured_rtt
-
-        # Calculate new RTO
-        self.rto = self.srtt + max(self.K * self.rttvar, 0.2)
-
-        # Bound RTO to reasonable values
-        self.rto = max(self.MIN_RTO, min(self.MAX_RTO, self.rto))
-
-        return self.rto
-
-    def get_timeout(self):
-        """Get current timeout value"""
-        return self.rto
-
-    def handle_timeout(self):
-        """Double the RTO on timeout (exponential backoff)"""
-        self.rto = min(self.MAX_RTO, self.rto * 2)
-        return self.rto
-
-
-def create_packet(seq_num, data, start=False, end=False):
-    packet = {
-        "seq_num": seq_num,
-        "data_length": len(data),
-        "data": data,
-        "start": start,
-        "end": end,
-    }
-    json_str = json.dumps(packet)
-    return json_str.encode("utf-8")
-
-
-def get_seq_no_from_ack_pkt(ack_packet):
-    json_packet = json.loads(ack_packet.decode("utf-8"))
-    return json_packet["seq_num"], json_packet["end"]
-
-
-def send_file(server_ip, server_port, fast_recovery):
+        self.packet_times[seq_num] = now
+        self.timers.arm(seq_num, now + self.rtt_manager.get_timeout())
+        if seq_num < self.next_seq:
+            self.retransmitted.add(seq_num)
+        # logging.info(f"Sent packet {seq_num}")
+        return True
+
+    def on_packet(self, ack_packet):
+        receive_time = self.last_heard = time.monotonic()
+        flags, _, ack_seq_num, _ = parse_packet(ack_packet)
+        if flags & FLAG_START:
+            # Client missed our start reply and is asking again
+            self.send_start_info()
+            return
+        self.last_event_time = receive_time
+        # logging.info(f"Ack Seq Num : {ack_seq_num}")
+
+        # logging.info(f"Received Ack for: {ack_seq_num}")
+        if flags & FLAG_END:
+            logging.info(f"File Transfer Complete")
+            self.done = True
+            return
+        if ack_seq_num > self.base_seq:
+            self.sample_rtt(ack_seq_num, receive_time)
+            self.mark_acked(ack_seq_num, receive_time)
+            self.dup_acks = 0
+        elif ack_seq_num == self.base_seq and ack_seq_num < self.max_seq:
+            # The client is still missing base_seq but got something after it
+            self.dup_acks += 1
+            if self.dup_acks == DUP_ACK_THRESHOLD and self.fast_recovery:
+                self.fast_retransmit(receive_time)
+
+    def fast_retransmit(self, now):
+        """Resend base_seq now instead of waiting for its timer."""
+        seq_num = self.base_seq
+        deadline = self.timers.cancel(seq_num)
+        self.transmit(seq_num, now)
+        self.fast_sent[seq_num] = now
+        self.stats.fast_retransmits += 1
+        if deadline is not None:
+            self.stats.time_saved += max(0.0, deadline - now)
+        # logging.info(f"Sending Fast Recovery packet {seq_num}")
+
+    def sample_rtt(self, ack_seq_num, receive_time):
+        """Time the ACK against the newest segment it covers (Karn's rule).
+
+        No sample is taken if any covered segment was retransmitted, since
+        the ACK could then belong to either copy.
+        """
+        sent_time = self.packet_times.get(ack_seq_num - MSS)
+        if sent_time is None:
+            return
+        for seq in range(self.base_seq, ack_seq_num, MSS):
+            if seq in self.retransmitted:
+                return
+        new_timeout = self.rtt_manager.update_rtt(receive_time - sent_time)
+        # logging.info(f"Measured RTT: {receive_time - sent_time}, New timeout: {new_timeout}")
+
+    def mark_acked(self, ack_seq_num, now):
+        """Apply a cumulative ACK: everything below it has arrived.
+
+        Each segment is marked once over the whole transfer, so this is
+        O(1) amortised per segment and completion is just a zero count.
+        """
+        for seq in range(self.base_seq, ack_seq_num, MSS):
+            self.timers.cancel(seq)
+            self.packet_times.pop(seq, None)
+            self.retransmitted.discard(seq)
+            sent = self.fast_sent.pop(seq, None)
+            if sent is not None:
+                self.stats.recoveries += 1
+                self.stats.recovery_time += now - sent
+            if not self.acked[seq // MSS]:
+                self.acked[seq // MSS] = 1
+                self.outstanding -= 1
+        self.base_seq = ack_seq_num
+
+    def deadline(self):
+        """Time at which check_timeout will next declare a timeout"""
+        deadline = self.timers.next_deadline()
+        if deadline is None:
+            deadline = self.last_event_time + self.rtt_manager.get_timeout()
+        return min(deadline, self.last_heard + IDLE_TIMEOUT)
+
+    def check_timeout(self, now):
+        if now >= self.last_heard + IDLE_TIMEOUT:
+            # The client has died, or every ACK of our END was lost
+            logging.warning(
+                f"Giving up on {self.client_address[0]}:{self.client_address[1]}, "
+                f"silent for {IDLE_TIMEOUT:.0f}s"
+            )
+            self.done = True
+            return
+        if now < self.deadline():
+            return
+        expired = [seq for seq in self.timers.pop_expired(now) if seq >= self.base_seq]
+        # Only segments sent since the last timeout back the timer off again
+        if not expired or any(
+            self.packet_times[seq] > self.last_timeout for seq in expired
+        ):
+            # logging.warning("Timeout occurred, adjusting timeout value")
+            new_timeout = self.rtt_manager.handle_timeout()
+            # logging.info(f"New timeout after timeout event: {new_timeout}")
+            self.last_timeout = now
+        self.last_event_time = now
+        for seq in expired:
+            heapq.heappush(self.lost, seq)
+        self.send_window()
+
+
+def send_file(server_ip, server_port, fast_recovery, serve_forever=False):
+    """Serve the file; returns the RetransmitStats of every transfer and the
+    DrainStats of the socket."""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     server_socket.bind((server_ip, server_port))
-
-    rtt_manager = RTTManager()  # Create RTT manager instance
-
     # logging.info(f"Server listening on {server_ip}:{server_port}")
-    client_address = None
-    file_path = FILE_PATH
-
-    ack_packet, client_address = server_socket.recvfrom(1024)
-    # logging.info(f"Client Address: {client_address}")
-
-    file_data = {}
-    seq_num = 0
-    max_seq = 0
-    ack_data = {}
-    with open(file_path, "r") as file:
-        while True:
-            chunk = file.read(MSS)
-            if not chunk:
-                file_data[seq_num] = "EOD"
-                max_seq = max(max_seq, seq_num)
-                seq_num = 0
-                break
-            file_data[seq_num] = chunk
-            max_seq = max(max_seq, seq_num)
-            ack_data[seq_num] = {"seq_num": seq_num, "ack_rec": False, "ack_count": 0}
-            seq_num += MSS
-
-    base_seq = 0
-    packet_times = {}
-    while base_seq <= max_seq:
-        current_timeout = rtt_manager.get_timeout()
-        # logging.info(f"Current timeout: {current_timeout}")
-
-        for seq_num in range(
-            base_seq, min(max_seq + MSS, base_seq + WINDOW_SIZE * MSS + MSS), MSS
-        ):
-            current_time = time.time()
-            if (
-                seq_num in packet_times
-                and current_time - packet_times[seq_num] < current_timeout
-            ):
-                continue
 
-            packet_times[seq_num] = current_time
-            chunk = file_data[seq_num]
-            logging.info(ack_data)
-            received_for_all = True
-            for seq in range(base_seq, max_seq, MSS):
-                if not ack_data[seq]["ack_rec"]:
-                    received_for_all = False
-            if chunk == "EOD":
-                # packet = create_packet(seq_num, chunk, start=False, end=True)
-                if received_for_all:
-                    packet = create_packet(seq_num, chunk, start=False, end=True)
-                else:
-                    # logging.info("Caught here")
-                    continue
-            else:
-                packet = create_packet(seq_num, chunk, start=False)
-            server_socket.sendto(packet, client_address)
-            # logging.info(f"Sent packet {seq_num} {chunk}")
-
-            try:
-                server_socket.settimeout(current_timeout)
-                ack_packet, _ = server_socket.recvfrom(1024)
-                receive_time = time.time()
-                ack_seq_num, end = get_seq_no_from_ack_pkt(ack_packet)
-                # logging.info(f"Ack Seq Num : {ack_seq_num}")
-
-                # Calculate RTT and update timeout if this is an ACK for a packet we sent
-                if ack_seq_num - MSS in packet_times:
-                    measured_rtt = receive_time - packet_times[ack_seq_num - MSS]
-                    new_timeout = rtt_manager.update_rtt(measured_rtt)
-                    # logging.info(f"Measured RTT: {measured_rtt}, New timeout: {new_timeout}")
-
-                # logging.info(f"Received Ack for: {ack_seq_num}")
-                if end:
-                    logging.info(f"File Transfer Complete")
-                    base_seq = max_seq + 1
-                    return
-                if ack_seq_num <= base_seq:
-                    continue
-
-                ack_data[ack_seq_num - MSS]["ack_rec"] = True
-                ack_data[ack_seq_num - MSS]["ack_count"] += 1
-                base_seq = max(base_seq, ack_seq_num)
-                if (
-                    ack_data[ack_seq_num - MSS]["ack_count"] >= DUP_ACK_THRESHOLD
-                    and fast_recovery
-                ):
-                    seq = ack_seq_num
-                    chunk = file_data[seq]
-                    ack_data[seq]["ack_count"] = 0
-                    packet_times[seq] = time.time()
-                    packet = create_packet(seq, chunk, start=False)
-                    # logging.info(f"Sending Fast Recovery packet {seq_num} {chunk}")
-
-            except socket.timeout:
-                # logging.warning("Timeout occurred, adjusting timeout value")
-                new_timeout = rtt_manager.handle_timeout()
-                # logging.info(f"New timeout after timeout event: {new_timeout}")
+    stats = RetransmitStats()
+    # Every client reads from the same mapping of the file
+    with FileSource(FILE_PATH) as source:
+        drain = serve(
+            server_socket,
+            lambda client_address: ReliableTransfer(
+                server_socket, client_address, source, fast_recovery, stats
+            ),
+            serve_forever,
+        )
+    server_socket.close()
+    logging.info(f"Retransmissions: {stats}")
+    return stats, drain
 
 
 parser = argparse.ArgumentParser(description="Reliable file transfer server over UDP.")
 parser.add_argument("server_ip", help="IP address of the server")
 parser.add_argument("server_port", type=int, help="Port number of the server")
 parser.add_argument("fast_recovery", type=int, help="Enable fast recovery")
+parser.add_argument(
+    "--serve_forever",
+    action="store_true",
+    help="Keep serving new clients instead of exiting after the transfers",
+)
+parser.add_argument(
+    "--stats",
+    action="store_true",
+    help="Print retransmission and ACK-draining counters when the server exits",
+)
 
 args = parser.parse_args()
 
 # Run the server
-send_file(args.server_ip, args.server_port, args.fast_recovery)
+stats, drain = send_file(
+    args.server_ip, args.server_port, args.fast_recovery, args.serve_forever
+)
+if args.stats:
+    print(stats)
+    print(f"ACK draining: {drain}")
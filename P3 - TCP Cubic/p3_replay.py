@@ -0,0 +1,130 @@
+"""Replay a recorded congestion-control trace and check the window trajectory.
+
+Record a trace with ``p3_server.py ... --trace trace.csv`` (or
+``trace.bin`` for a binary one), then run ``python3 p3_replay.py trace.csv``.
+Every event is fed to a fresh controller per connection, of the algorithm
+the trace recorded and opened with the segment size and initial window that
+connection negotiated. The script reports the first event at which the
+replayed window differs from the recorded one and, for CUBIC, any step that
+breaks RFC 9438 (decrease by beta, one segment after a timeout, no shrinking
+on ACKs, at most L segments per ACK in slow start). Exits non-zero on any
+failure.
+"""
+
+import argparse
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cc import ALGORITHMS, create
+from common.cc.cubic import CUBIC_BETA, SLOW_START_LIMIT
+from common.cc.trace import read_trace
+
+TOLERANCE = 1e-6  # Relative, trace values are written with repr()
+
+
+def close(a, b):
+    return math.isclose(a, b, rel_tol=TOLERANCE) or (math.isinf(a) and math.isinf(b))
+
+
+def check_step(row, before_cwnd, before_ssthresh, cc):
+    """Return why this CUBIC step breaks RFC 9438, or None."""
+    event = row["event"]
+    mss = cc.mss
+    reduced = max(before_cwnd * CUBIC_BETA, 2 * mss)
+    if event == "loss":
+        if not (close(cc.ssthresh, reduced) and close(cc.cwnd, reduced)):
+            return f"loss should leave cwnd = ssthresh = {reduced:.0f}"
+    elif event == "timeout":
+        if not (close(cc.ssthresh, reduced) and close(cc.cwnd, mss)):
+            return f"timeout should leave cwnd = {mss}, ssthresh = {reduced:.0f}"
+    elif event == "ack":
+        if cc.cwnd < before_cwnd * (1 - TOLERANCE):
+            return "cwnd shrank on an ACK"
+        if before_cwnd < before_ssthresh:
+            if cc.cwnd - before_cwnd > SLOW_START_LIMIT * mss * (1 + TOLERANCE):
+                return f"slow start grew by more than {SLOW_START_LIMIT} segments"
+    if cc.cwnd < mss * (1 - TOLERANCE):
+        return "cwnd fell below one segment"
+    return None
+
+
+def replay(path):
+    controllers = {}
+    diverged = set()
+    events = failures = 0
+    for row in read_trace(path):
+        events += 1
+        if row["conn"] not in controllers:
+            if row["cc"] not in ALGORITHMS:
+                print(f"{row['conn']}: trace records no known algorithm")
+                failures += 1
+                controllers[row["conn"]] = None
+                continue
+            window = 1
+            if row["event"] == "open":
+                window = round(row["cwnd"] / row["mss"])
+            controllers[row["conn"]] = create(row["cc"], row["mss"], window)
+        cc = controllers[row["conn"]]
+        if cc is None:
+            continue
+        before_cwnd, before_ssthresh = cc.cwnd, cc.ssthresh
+        if row["delivered"]:
+            cc.on_delivered(row["delivered"], row["time"])
+        if row["event"] == "open":
+            pass  # Created above with the negotiated window
+        elif row["event"] == "sack":
+            pass  # Nothing beyond the delivered bytes
+        elif row["event"] == "ack":
+            cc.on_ack(
+                row["acked"],
+                row["time"],
+                row["rtt"],
+                row["srtt"],
+                row["ack_seq"],
+                row["next_seq"],
+            )
+        elif row["event"] == "loss":
+            cc.on_loss(row["time"])
+        elif row["event"] == "recovery_end":
+            cc.on_recovery_end(row["time"])
+        elif row["event"] == "timeout":
+            cc.on_timeout(row["time"])
+        else:
+            print(f"{row['conn']} event {events}: unknown event {row['event']!r}")
+            failures += 1
+            continue
+
+        problem = None
+        if cc.name == "cubic":
+            problem = check_step(row, before_cwnd, before_ssthresh, cc)
+        if problem is None and not (
+            close(cc.cwnd, row["cwnd"]) and close(cc.ssthresh, row["ssthresh"])
+        ):
+            problem = (
+                f"replayed cwnd {cc.cwnd:.1f} / ssthresh {cc.ssthresh:.1f}, "
+                f"recorded {row['cwnd']:.1f} / {row['ssthresh']:.1f}"
+            )
+        if problem is not None:
+            failures += 1
+            # Once a connection diverges every later event will too
+            if row["conn"] not in diverged:
+                diverged.add(row["conn"])
+                print(f"{row['conn']} event {events} ({row['event']}): {problem}")
+
+    print(f"{events} events over {len(controllers)} connections, {failures} failures")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a congestion-control trace and check the window trajectory."
+    )
+    parser.add_argument("trace", help="Trace written by p3_server.py --trace")
+    args = parser.parse_args()
+    sys.exit(0 if replay(args.trace) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Benchmark suite: every protocol variant over a matrix of conditions.
+
+Each run sends a file of a given size through the userspace emulator in
+Experiments/netem.py at a given loss rate and RTT, and measures:
+
+- throughput: every byte the sender put on the wire, headers and
+  retransmissions included, over the completion time
+- goodput: file bytes delivered over the completion time
+- retransmission ratio: data segments sent more than once, over all sent
+- completion time, from client start to client exit (p50 and p99 over the
+  repetitions of a case)
+- sender CPU-seconds, from the server process's resource usage
+
+Results go to a JSON file. Compared against a stored baseline, a case whose
+goodput, p50 completion time or sender CPU time is more than the tolerance
+worse counts as a regression and fails the run.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Experiments"))
+from common.packet import FLAG_ACK, FLAG_START, HEADER
+from netem import IP_UDP_OVERHEAD, Emulator, Route, link_pair
+
+HOST = "127.0.0.1"
+OUTFILE = "received_file.txt"
+STARTUP = 0.5  # Seconds a server gets to bind before its client starts
+DEFAULT_MATRIX = os.path.join(os.path.dirname(os.path.abspath(__file__)), "matrix.json")
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baseline.json"
+)
+
+# Metric -> True if higher is better, checked against the baseline
+COMPARED = {"goodput_mbps": True, "ttc_p50": False, "sender_cpu_s": False}
+
+
+class WireCounter:
+    """Counts what the sender puts on the wire, as the relay sees it."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.segments = 0
+        self.retransmits = 0
+        self.seen = set()
+
+    def tap(self, upstream, data):
+        if upstream or len(data) < HEADER.size:
+            return
+        self.bytes += len(data) + IP_UDP_OVERHEAD
+        _, flags, _, seq_num, _, _ = HEADER.unpack_from(data)
+        if flags & (FLAG_START | FLAG_ACK):
+            return
+        self.segments += 1
+        if seq_num in self.seen:
+            self.retransmits += 1
+        self.seen.add(seq_num)
+
+
+def percentile(values, p):
+    """Linear-interpolated percentile ``p`` (0-100) of ``values``."""
+    values = sorted(values)
+    position = (len(values) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def make_file(path, size, seed):
+    """Incompressible, reproducible test file; returns its SHA-256."""
+    data = random.Random(f"{seed}:{size}").randbytes(size)
+    with open(path, "wb") as f:
+        f.write(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def stop(process, timeout):
+    """Wait for a process, killing it after ``timeout``; return its CPU-seconds."""
+    deadline = time.monotonic() + timeout
+    while True:
+        pid, _, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            process.returncode = 0
+            return usage.ru_utime + usage.ru_stime
+        if time.monotonic() >= deadline:
+            process.kill()
+            _, _, usage = os.wait4(process.pid, 0)
+            process.returncode = -1
+            return usage.ru_utime + usage.ru_stime
+        time.sleep(0.01)
+
+
+def run_once(variant, source, digest, loss, rtt, seed, port, timeout):
+    """One transfer; returns its measurements, or None if it failed."""
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        shutil.copy(source, os.path.join(workdir, "sending_file.txt"))
+        link = {"loss": loss, "delay": rtt / 2}
+        up, down = link_pair(link, seed)
+        counter = WireCounter()
+        emulator = Emulator([Route(port + 1, port, [up], [down], tap=counter.tap)])
+        emulator.start()
+        part = os.path.join(ROOT, variant["part"])
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(part, variant["server"]), HOST, str(port)]
+            + variant.get("server_args", []),
+            cwd=workdir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            time.sleep(STARTUP)
+            start = time.monotonic()
+            client = subprocess.run(
+                [sys.executable, os.path.join(part, variant["client"]), HOST]
+                + [str(port + 1)]
+                + variant.get("client_args", []),
+                cwd=workdir,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=timeout,
+            )
+            ttc = time.monotonic() - start
+        except subprocess.TimeoutExpired:
+            client = None
+        finally:
+            cpu = stop(server, 5)
+            emulator.stop()
+        if client is None or client.returncode != 0:
+            return None
+        if file_hash(os.path.join(workdir, OUTFILE)) != digest:
+            return None
+        size = os.path.getsize(source)
+        return {
+            "ttc": ttc,
+            "throughput_mbps": counter.bytes * 8 / ttc / 1e6,
+            "goodput_mbps": size * 8 / ttc / 1e6,
+            "retransmission_ratio": counter.retransmits / max(1, counter.segments),
+            "sender_cpu_s": cpu,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summarize(runs):
+    """Aggregate the successful repetitions of one case."""
+    ttcs = [run["ttc"] for run in runs]
+    mean = lambda key: sum(run[key] for run in runs) / len(runs)
+    return {
+        "throughput_mbps": mean("throughput_mbps"),
+        "goodput_mbps": mean("goodput_mbps"),
+        "retransmission_ratio": mean("retransmission_ratio"),
+        "ttc_p50": percentile(ttcs, 50),
+        "ttc_p99": percentile(ttcs, 99),
+        "sender_cpu_s": mean("sender_cpu_s"),
+    }
+
+
+def case_key(case):
+    return (
+        f"{case['variant']} size={case['size']} loss={case['loss']} rtt={case['rtt']}"
+    )
+
+
+def run_matrix(matrix, variants, port):
+    """Run every case of the matrix; return the list of case results."""
+    scratch = tempfile.mkdtemp(prefix="bench_files_")
+    results = []
+    try:
+        for size in matrix["sizes"]:
+            source = os.path.join(scratch, f"{size}.bin")
+            digest = make_file(source, size, matrix["seed"])
+            for name in variants:
+                for loss in matrix["loss"]:
+                    for rtt in matrix["rtt"]:
+                        case = {"variant": name, "size": size, "loss": loss, "rtt": rtt}
+                        runs = []
+                        for i in range(matrix["repeat"]):
+                            seed = f"{matrix['seed']}:{case_key(case)}:{i}"
+                            run = run_once(
+                                matrix["variants"][name],
+                                source,
+                                digest,
+                                loss,
+                                rtt,
+                                seed,
+                                port,
+                                matrix["timeout"],
+                            )
+                            if run is not None:
+                                runs.append(run)
+                        case["runs"] = len(runs)
+                        case["failures"] = matrix["repeat"] - len(runs)
+                        if runs:
+                            case.update(summarize(runs))
+                        print(format_case(case), flush=True)
+                        results.append(case)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def format_case(case):
+    if not case["runs"]:
+        return f"{case_key(case)}: every run failed"
+    return (
+        f"{case_key(case)}: goodput {case['goodput_mbps']:.2f} Mbit/s, "
+        f"throughput {case['throughput_mbps']:.2f} Mbit/s, "
+        f"retransmitted {case['retransmission_ratio']:.1%}, "
+        f"ttc p50 {case['ttc_p50']:.3f}s p99 {case['ttc_p99']:.3f}s, "
+        f"sender CPU {case['sender_cpu_s']:.3f}s"
+        + (f", {case['failures']} failed" if case["failures"] else "")
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as printable lines."""
+    previous = {case_key(case): case for case in baseline["results"]}
+    regressions = []
+    for case in results:
+        before = previous.get(case_key(case))
+        if before is None or not before["runs"]:
+            continue
+        if not case["runs"]:
+            regressions.append(f"{case_key(case)}: every run failed")
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            change = (case[metric] - before[metric]) / before[metric]
+            if higher_is_better:
+                change = -change
+            if change > tolerance:
+                regressions.append(
+                    f"{case_key(case)}: {metric} {before[metric]:.3f} -> "
+                    f"{case[metric]:.3f} ({change:.0%} worse)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark every protocol variant through the network emulator."
+    )
+    parser.add_argument(
+        "--matrix",
+        default=DEFAULT_MATRIX,
+        help="JSON matrix of variants and conditions",
+    )
+    parser.add_argument(
+        "--variants", nargs="+", help="Only these variants of the matrix (default: all)"
+    )
+    parser.add_argument(
+        "--output", default="bench_results.json", help="Where to write the results"
+    )
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help="Results to compare against (default benchmarks/baseline.json)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Fraction by which a metric may be worse than the baseline (default 0.2)",
+    )
+    parser.add_argument(
+        "--save_baseline",
+        action="store_true",
+        help="Store these results as the new baseline instead of comparing",
+    )
+    parser.add_argument("--port", type=int, default=47000, help="Server port to use")
+    args = parser.parse_args()
+
+    with open(args.matrix) as f:
+        matrix = json.load(f)
+    variants = args.variants or list(matrix["variants"])
+    results = run_matrix(matrix, variants, args.port)
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "matrix": matrix,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Helpers shared by the P1, P2 and P3 senders and receivers."""
@@ -0,0 +1,188 @@
+"""asyncio transport for the Reno/CUBIC senders and receivers.
+
+The per-connection sender state and the client classes are the same ones
+the blocking loops use; only the I/O and the retransmission timers move
+onto the event loop, so many transfers can share a single thread.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from common.packet import ProtocolError
+from common.server import RECV_SIZE, Demux, DrainStats
+
+
+class SocketWriter:
+    """Socket-like ``sendmsg`` for sender state running under asyncio.
+
+    Datagrams go straight out through the raw socket so payload slices are
+    never copied; only when the kernel buffer is full are they joined and
+    queued on the transport, which flushes them once the socket drains.
+    """
+
+    def __init__(self, sock, transport):
+        self.sock = sock
+        self.transport = transport
+
+    def sendmsg(self, buffers, ancdata, flags, address):
+        if not self.transport.get_write_buffer_size():
+            try:
+                return self.sock.sendmsg(buffers, ancdata, flags, address)
+            except (BlockingIOError, InterruptedError):
+                pass
+        self.transport.sendto(b"".join(buffers), address)
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    """Demultiplexes one socket across many transfers, like serve()."""
+
+    def __init__(self, sock, new_connection, serve_forever, finished):
+        self.sock = sock
+        self.new_connection = new_connection
+        self.serve_forever = serve_forever
+        self.finished = finished
+        self.stats = DrainStats()
+        self.timers = {}
+
+    def connection_made(self, transport):
+        writer = SocketWriter(self.sock, transport)
+        self.demux = Demux(
+            transport,
+            lambda client_address: self.new_connection(writer, client_address),
+        )
+
+    def datagram_received(self, packet, client_address):
+        touched = {}
+        self.demux.dispatch(packet, client_address, touched)
+        # Drain every ACK already queued behind this one before sending, so
+        # a full window of ACKs costs one wakeup instead of one each
+        batch = 1
+        while True:
+            try:
+                packet, client_address = self.sock.recvfrom(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            batch += 1
+            self.demux.dispatch(packet, client_address, touched)
+        self.stats.record(batch)
+
+        self.demux.flush(touched)
+        for client_address, connection in touched.items():
+            self.settle(client_address, connection)
+
+    def settle(self, client_address, connection):
+        """Forget finished connections and keep a timer armed for live ones."""
+        if connection.done:
+            self.demux.discard(client_address)
+            timer = self.timers.pop(client_address, None)
+            if timer is not None:
+                timer.cancel()
+            if not self.demux.connections and not self.serve_forever:
+                if not self.finished.done():
+                    self.finished.set_result(self.stats)
+        else:
+            # Timers are re-armed lazily when they fire, so ACKs that push
+            # the deadline back never have to cancel and reschedule them;
+            # only an earlier deadline (a paced send) replaces the timer.
+            # The loop's clock is time.monotonic(), like the deadlines.
+            deadline = connection.deadline()
+            timer = self.timers.get(client_address)
+            if timer is not None:
+                if timer.when() <= deadline:
+                    return
+                timer.cancel()
+            self.timers[client_address] = asyncio.get_running_loop().call_at(
+                deadline, self.on_timer, client_address
+            )
+
+    def on_timer(self, client_address):
+        del self.timers[client_address]
+        connection = self.demux.connections.get(client_address)
+        if connection is None:
+            return
+        connection.check_timeout(time.monotonic())
+        self.settle(client_address, connection)
+
+
+async def serve(server_socket, new_connection, serve_forever=False):
+    """Event-loop counterpart of common.server.serve.
+
+    ``new_connection(writer, client_address)`` receives a socket-like writer
+    to send through instead of the bound socket itself.
+    """
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+    server_socket.setblocking(False)
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: ServerProtocol(server_socket, new_connection, serve_forever, finished),
+        sock=server_socket,
+    )
+    try:
+        stats = await finished
+    finally:
+        transport.close()
+    logging.info(f"ACK draining: {stats}")
+    return stats
+
+
+class ReceiverProtocol(asyncio.DatagramProtocol):
+    """Feeds datagrams to a client object's handle_packet/handle_timeout."""
+
+    def __init__(self, client, server_address, timeout, finished):
+        self.client = client
+        self.server_address = server_address
+        self.timeout = timeout
+        self.finished = finished
+        self.last_packet_time = time.time()
+        self.timer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.client.send_start(transport, self.server_address)
+        self.arm(self.timeout)
+
+    def datagram_received(self, packet, _):
+        self.last_packet_time = time.time()
+        if self.finished.done():
+            return
+        try:
+            if self.client.handle_packet(self.transport, self.server_address, packet):
+                self.timer.cancel()
+                self.finished.set_result(None)
+        except ProtocolError as e:
+            self.timer.cancel()
+            self.finished.set_exception(e)
+
+    def arm(self, delay):
+        self.timer = asyncio.get_running_loop().call_later(delay, self.on_timer)
+
+    def on_timer(self):
+        idle = time.time() - self.last_packet_time
+        if idle >= self.timeout:
+            self.client.handle_timeout(self.transport, self.server_address)
+            self.last_packet_time = time.time()
+            idle = 0.0
+        self.arm(self.timeout - idle)
+
+
+async def receive(client, server_address, timeout):
+    """Run one download with ``client`` until its handle_packet reports the
+    end, then leave it a copy of the socket to linger on."""
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: ReceiverProtocol(client, server_address, timeout, finished),
+        family=socket.AF_INET,
+        local_addr=("0.0.0.0", 0),
+    )
+    try:
+        await finished
+        # A copy of the socket for the client to linger on after we close it
+        sock = transport.get_extra_info("socket")
+        with socket.socket(fileno=os.dup(sock.fileno())) as linger_socket:
+            client.linger(linger_socket, server_address)
+    finally:
+        transport.close()
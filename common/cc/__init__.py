@@ -0,0 +1,21 @@
+"""Congestion-control algorithms used by the senders.
+
+Each algorithm implements the CongestionControl interface and is listed
+in ALGORITHMS under the name the ``--cc`` option accepts.
+"""
+
+from common.cc.bbr import BBR
+from common.cc.cubic import Cubic
+from common.cc.reno import Reno
+
+ALGORITHMS = {
+    "reno": Reno,
+    "cubic": Cubic,
+    "bbr": BBR,
+}
+
+
+def create(name, mss, initial_window=1):
+    """A fresh controller for one connection, starting at ``initial_window``
+    segments."""
+    return ALGORITHMS[name](mss, initial_window)
@@ -0,0 +1,41 @@
+class CongestionControl:
+    """Interface between the sender engine and a congestion controller.
+
+    ``cwnd`` is the most bytes the engine may have in flight, ``ssthresh``
+    the slow-start threshold (reported in traces), and ``pacing_rate`` the
+    rate in bytes per second to spread sends at, or None to send as soon
+    as the window opens. ``name`` is the algorithm's key in ALGORITHMS,
+    which traces record. Every hook is handed the current time instead of
+    reading a clock, so recorded traces replay exactly.
+    """
+
+    name = None
+    pacing_rate = None
+
+    def on_ack(self, acked, now, rtt, srtt, ack_seq, next_seq):
+        """``acked`` new bytes were cumulatively acknowledged.
+
+        ``rtt`` is the RTT sample of this ACK (None if Karn's rule withheld
+        it), ``srtt`` the smoothed RTT, ``ack_seq`` the cumulative ACK and
+        ``next_seq`` one past the highest byte sent.
+        """
+        raise NotImplementedError
+
+    def on_delivered(self, delivered, now):
+        """An ACK told the sender of ``delivered`` bytes the client had not
+        reported before, cumulatively or by SACK.
+
+        Called for every such ACK, duplicate or new, in or out of fast
+        recovery, before the hook for the ACK itself.
+        """
+
+    def on_loss(self, now):
+        """Duplicate ACKs reported a loss; fast recovery starts."""
+        raise NotImplementedError
+
+    def on_recovery_end(self, now):
+        """A new ACK ended fast recovery."""
+
+    def on_timeout(self, now):
+        """The retransmission timer expired."""
+        raise NotImplementedError
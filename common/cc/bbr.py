@@ -0,0 +1,190 @@
+"""BBR-style model-based congestion control.
+
+Instead of reacting to each loss, the controller keeps a model of the
+path: the bottleneck bandwidth, taken as the windowed maximum of the ACK
+delivery rate, and the propagation delay, taken as the windowed minimum
+RTT. It paces at gain * bandwidth with a window of a small multiple of
+the bandwidth-delay product, following BBRv1's state machine: STARTUP
+until the bandwidth stops growing, DRAIN to empty the queue STARTUP
+built, PROBE_BW cycling its pacing gain around 1, and PROBE_RTT to
+refresh the minimum RTT. Random loss therefore costs only the
+retransmissions.
+"""
+
+import math
+from collections import deque
+
+from common.cc.base import CongestionControl
+
+HIGH_GAIN = 2 / math.log(2)  # Doubles the sending rate every round
+PROBE_BW_GAINS = [1.25, 0.75, 1, 1, 1, 1, 1, 1]
+CWND_GAIN = 2
+BW_WINDOW_ROUNDS = 10  # Rounds the bandwidth max filter remembers
+MIN_RTT_WINDOW = 10.0  # Seconds before the min RTT must be re-measured
+PROBE_RTT_DURATION = 0.2
+FULL_BW_GROWTH = 1.25  # STARTUP ends once three rounds grow less than this
+FULL_BW_ROUNDS = 3
+MIN_CWND = 4  # Segments
+
+STARTUP, DRAIN, PROBE_BW, PROBE_RTT = "startup", "drain", "probe_bw", "probe_rtt"
+
+
+class BBR(CongestionControl):
+    name = "bbr"
+
+    def __init__(self, mss, initial_window=MIN_CWND):
+        self.mss = mss
+        self.cwnd = max(initial_window, MIN_CWND) * mss
+        self.ssthresh = math.inf  # Unused, reported in traces
+        self.pacing_rate = None  # Bytes per second, once bandwidth is known
+        self.state = STARTUP
+        self.pacing_gain = HIGH_GAIN
+        self.cwnd_gain = HIGH_GAIN
+
+        # Delivery rate: bytes delivered over the last min RTT of ACK arrivals
+        self.delivered = 0
+        self.ack_history = deque()  # (time, delivered)
+
+        self.bw_rounds = deque(maxlen=BW_WINDOW_ROUNDS)  # Max rate per round
+        self.round_bw = 0.0
+        self.round_end = 0  # A round ends when the ACK passes this sequence
+        self.full_bw = 0.0
+        self.full_bw_count = 0
+
+        self.min_rtt = math.inf
+        self.min_rtt_stamp = 0.0
+        self.probe_rtt_done = None
+        self.cycle_index = 0
+        self.cycle_stamp = 0.0
+
+    def btl_bw(self):
+        return max(max(self.bw_rounds, default=0.0), self.round_bw)
+
+    def bdp(self):
+        if math.isinf(self.min_rtt) or not self.btl_bw():
+            return None
+        return self.btl_bw() * self.min_rtt
+
+    def on_delivered(self, delivered, now):
+        # Every ACK, SACKs and the one ending recovery included, so random
+        # loss does not make the delivery rate look lower than it is
+        self.update_rate(delivered, now)
+
+    def on_ack(self, acked, now, rtt, srtt, ack_seq, next_seq):
+        if rtt is not None and (
+            rtt <= self.min_rtt or now - self.min_rtt_stamp > MIN_RTT_WINDOW
+        ):
+            self.min_rtt = rtt
+            self.min_rtt_stamp = now
+
+        round_over = ack_seq >= self.round_end
+        if round_over:
+            self.round_end = next_seq
+            self.bw_rounds.append(self.round_bw)
+            self.round_bw = 0.0
+
+        inflight = next_seq - ack_seq
+        if self.state == STARTUP and round_over:
+            self.check_full_pipe()
+        if self.state == DRAIN:
+            bdp = self.bdp()
+            if bdp is not None and inflight <= bdp:
+                self.enter_probe_bw(now)
+        if self.state == PROBE_BW:
+            self.advance_cycle(now, inflight)
+        self.check_probe_rtt(now, inflight)
+
+        self.set_pacing_rate()
+        self.set_cwnd(acked)
+
+    def update_rate(self, delivered, now):
+        self.delivered += delivered
+        history = self.ack_history
+        history.append((now, self.delivered))
+        interval = self.min_rtt if not math.isinf(self.min_rtt) else 0.0
+        while len(history) > 2 and now - history[1][0] >= interval:
+            history.popleft()
+        then, delivered_then = history[0]
+        if now > then:
+            rate = (self.delivered - delivered_then) / (now - then)
+            self.round_bw = max(self.round_bw, rate)
+
+    def check_full_pipe(self):
+        bw = self.btl_bw()
+        if bw >= self.full_bw * FULL_BW_GROWTH:
+            self.full_bw = bw
+            self.full_bw_count = 0
+            return
+        self.full_bw_count += 1
+        if self.full_bw_count >= FULL_BW_ROUNDS:
+            # Bandwidth has plateaued: drain the queue STARTUP built up
+            self.state = DRAIN
+            self.pacing_gain = 1 / HIGH_GAIN
+            self.cwnd_gain = HIGH_GAIN
+
+    def enter_probe_bw(self, now):
+        self.state = PROBE_BW
+        self.cwnd_gain = CWND_GAIN
+        # Start anywhere but the draining 0.75 phase
+        self.cycle_index = 2
+        self.cycle_stamp = now
+        self.pacing_gain = PROBE_BW_GAINS[self.cycle_index]
+
+    def advance_cycle(self, now, inflight):
+        full_length = now - self.cycle_stamp >= self.min_rtt
+        bdp = self.bdp() or 0.0
+        if self.pacing_gain > 1:
+            # Stay probing until the extra data is actually in flight
+            if not full_length or inflight < self.pacing_gain * bdp:
+                return
+        elif self.pacing_gain < 1:
+            # Stop draining once the queue the probe built is gone, or after
+            # a round trip at the latest
+            if not full_length and inflight > bdp:
+                return
+        elif not full_length:
+            return
+        self.cycle_index = (self.cycle_index + 1) % len(PROBE_BW_GAINS)
+        self.cycle_stamp = now
+        self.pacing_gain = PROBE_BW_GAINS[self.cycle_index]
+
+    def check_probe_rtt(self, now, inflight):
+        if self.state != PROBE_RTT:
+            if self.state != STARTUP and now - self.min_rtt_stamp > MIN_RTT_WINDOW:
+                # The min RTT is stale: drain the pipe briefly to re-measure it
+                self.state = PROBE_RTT
+                self.pacing_gain = 1
+                self.probe_rtt_done = None
+            return
+        if self.probe_rtt_done is None and inflight <= MIN_CWND * self.mss:
+            self.probe_rtt_done = now + max(PROBE_RTT_DURATION, self.min_rtt)
+        if self.probe_rtt_done is not None and now >= self.probe_rtt_done:
+            self.min_rtt_stamp = now
+            self.enter_probe_bw(now)
+
+    def set_pacing_rate(self):
+        bw = self.btl_bw()
+        if bw:
+            self.pacing_rate = self.pacing_gain * bw
+
+    def set_cwnd(self, acked):
+        if self.state == PROBE_RTT:
+            self.cwnd = MIN_CWND * self.mss
+            return
+        bdp = self.bdp()
+        if bdp is None or self.state == STARTUP and self.cwnd < self.cwnd_gain * bdp:
+            # No model yet, or still climbing to it: grow like slow start
+            self.cwnd += acked
+        else:
+            self.cwnd = min(self.cwnd + acked, self.cwnd_gain * bdp)
+        self.cwnd = max(self.cwnd, MIN_CWND * self.mss)
+
+    def on_loss(self, now):
+        # Loss is not a congestion signal for the model; the engine only
+        # retransmits the holes
+        pass
+
+    def on_timeout(self, now):
+        # Nothing ACKed for an RTO: restart from a small window, the next
+        # ACK regrows it toward the model
+        self.cwnd = MIN_CWND * self.mss
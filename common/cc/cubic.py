@@ -0,0 +1,126 @@
+"""CUBIC congestion control (RFC 9438)."""
+
+import math
+
+from common.cc.base import CongestionControl
+from common.cc.hystart import HyStart
+
+CUBIC_C = 0.4  # In segments and seconds, as RFC 9438 defines it
+CUBIC_BETA = 0.7
+# Additive increase that gives the Reno-friendly estimate Reno's average rate
+ALPHA_CUBIC = 3 * (1 - CUBIC_BETA) / (1 + CUBIC_BETA)
+SLOW_START_LIMIT = 8  # L: most segments slow start may add per ACK (RFC 9406)
+
+
+class Cubic(CongestionControl):
+    """CUBIC window state for one connection.
+
+    Windows are kept in segments, which is what C and the cubic function
+    are calibrated for; ``cwnd`` and ``ssthresh`` convert them to bytes.
+    ``initial_cwnd`` and ``initial_ssthresh`` are given in segments too;
+    the unbounded default threshold leaves the first slow start to HyStart++.
+    """
+
+    name = "cubic"
+
+    def __init__(self, mss, initial_cwnd=1, initial_ssthresh=math.inf):
+        self.mss = mss
+        self.cwnd_segments = float(initial_cwnd)  # Segments, like ssthresh
+        self.ssthresh_segments = initial_ssthresh
+        self.cwnd_prior = 0.0  # Window just before the last congestion event
+        self.w_max = 0.0  # Plateau to climb back to, lowered by fast convergence
+        self.k = 0.0  # Seconds the cubic function takes to climb back to w_max
+        self.origin = 0.0  # Plateau of the cubic function for this epoch
+        self.epoch_start = None  # Set by the first ACK of congestion avoidance
+        self.w_est = 0.0  # Reno-friendly estimate
+        self.after_timeout = False  # Until congestion avoidance resumes
+        self.hystart = HyStart()
+        self.use_hystart = True  # Only the first slow start uses HyStart++
+
+    @property
+    def cwnd(self):
+        return self.cwnd_segments * self.mss
+
+    @property
+    def ssthresh(self):
+        return self.ssthresh_segments * self.mss
+
+    def w_cubic(self, t):
+        """W_cubic(t) = C * (t - K)^3 + W_max, in segments."""
+        return CUBIC_C * (t - self.k) ** 3 + self.origin
+
+    def on_ack(self, acked, now, rtt, srtt, ack_seq, next_seq):
+        # ack_seq and next_seq delimit the HyStart++ rounds
+        acked_segments = acked / self.mss
+        if self.cwnd_segments < self.ssthresh_segments:
+            if self.use_hystart and self.hystart.on_ack(ack_seq, next_seq, rtt):
+                # HyStart++ ends slow start; continue in congestion avoidance
+                self.ssthresh_segments = self.cwnd_segments
+                self.use_hystart = False
+            else:
+                divisor = self.hystart.growth_divisor() if self.use_hystart else 1
+                self.cwnd_segments += min(acked_segments, SLOW_START_LIMIT) / divisor
+                return
+        self.congestion_avoidance(acked_segments, now, srtt)
+
+    def congestion_avoidance(self, acked_segments, now, srtt):
+        cwnd = self.cwnd_segments
+        if self.epoch_start is None:
+            self.epoch_start = now
+            self.w_est = cwnd
+            if self.after_timeout:
+                # The old plateau says nothing after a timeout (RFC 9438
+                # section 4.8): start the curve afresh from here
+                self.after_timeout = False
+                self.w_max = cwnd
+                self.k = 0.0
+                self.origin = cwnd
+            elif cwnd < self.w_max:
+                self.k = ((self.w_max - cwnd) / CUBIC_C) ** (1 / 3)
+                self.origin = self.w_max
+            else:
+                # Already past the old maximum, probe upward from here
+                self.k = 0.0
+                self.origin = cwnd
+
+        t = now - self.epoch_start
+        # Aim for where the cubic curve will be one RTT from now, but never
+        # shrink and never grow by more than half the window per RTT
+        target = self.w_cubic(t + (srtt or 0.0))
+        target = min(max(target, cwnd), 1.5 * cwnd)
+
+        # Reno-friendly region: grow at least as fast as Reno would. Once
+        # the estimate reaches the window before the last congestion event
+        # Reno's own rate applies (RFC 9438 section 4.3).
+        alpha = 1.0 if self.w_est >= self.cwnd_prior else ALPHA_CUBIC
+        self.w_est += alpha * acked_segments / cwnd
+
+        if self.w_cubic(t) < self.w_est:
+            self.cwnd_segments = self.w_est
+        else:
+            self.cwnd_segments += (target - cwnd) / cwnd * acked_segments
+
+    def reduce(self):
+        """Multiplicative decrease shared by loss and timeout."""
+        cwnd = self.cwnd_segments
+        self.cwnd_prior = cwnd
+        # Fast convergence: a flow that lost before regaining its previous
+        # maximum releases bandwidth by aiming lower
+        if cwnd < self.w_max:
+            self.w_max = cwnd * (1 + CUBIC_BETA) / 2
+        else:
+            self.w_max = cwnd
+        self.ssthresh_segments = max(cwnd * CUBIC_BETA, 2.0)
+        self.epoch_start = None
+        self.use_hystart = False
+
+    def on_loss(self, now):
+        """Loss detected by duplicate ACKs: shrink to beta * cwnd."""
+        self.reduce()
+        self.cwnd_segments = self.ssthresh_segments
+
+    def on_timeout(self, now):
+        """Retransmission timeout: back to one segment and slow start."""
+        self.reduce()
+        self.cwnd_segments = 1.0
+        self.after_timeout = True
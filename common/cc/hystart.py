@@ -0,0 +1,67 @@
+"""HyStart++ slow-start exit (RFC 9406)."""
+
+import math
+
+N_RTT_SAMPLE = 8  # RTT samples a round needs before its min RTT is trusted
+MIN_RTT_THRESH = 0.004
+MAX_RTT_THRESH = 0.016
+MIN_RTT_DIVISOR = 8
+CSS_GROWTH_DIVISOR = 4  # Slow-start growth is divided by this in CSS
+CSS_ROUNDS = 5  # Rounds of CSS before leaving slow start for good
+
+
+class HyStart:
+    """Watches the per-round minimum RTT during slow start.
+
+    A round ends when the cumulative ACK passes the highest sequence sent
+    when it began. Once the round minimum rises by more than RttThresh
+    over the previous round's, slow start drops into Conservative Slow
+    Start (CSS); after CSS_ROUNDS rounds there, slow start ends. A falling
+    RTT during CSS means the rise was spurious and plain slow start resumes.
+    """
+
+    def __init__(self):
+        self.window_end = None
+        self.last_round_min_rtt = math.inf
+        self.current_round_min_rtt = math.inf
+        self.rtt_sample_count = 0
+        self.css_baseline_min_rtt = math.inf
+        self.css_rounds = 0
+        self.in_css = False
+
+    def growth_divisor(self):
+        return CSS_GROWTH_DIVISOR if self.in_css else 1
+
+    def on_ack(self, ack_seq, next_seq, rtt):
+        """Account one ACK; return True when slow start should end."""
+        if self.window_end is None or ack_seq >= self.window_end:
+            # A new round starts
+            self.window_end = next_seq
+            self.last_round_min_rtt = self.current_round_min_rtt
+            self.current_round_min_rtt = math.inf
+            self.rtt_sample_count = 0
+            if self.in_css:
+                self.css_rounds += 1
+                if self.css_rounds >= CSS_ROUNDS:
+                    return True
+
+        if rtt is not None:
+            self.current_round_min_rtt = min(self.current_round_min_rtt, rtt)
+            self.rtt_sample_count += 1
+
+        if self.rtt_sample_count < N_RTT_SAMPLE or math.isinf(self.last_round_min_rtt):
+            return False
+        if not self.in_css:
+            rtt_thresh = min(
+                max(self.last_round_min_rtt / MIN_RTT_DIVISOR, MIN_RTT_THRESH),
+                MAX_RTT_THRESH,
+            )
+            if self.current_round_min_rtt >= self.last_round_min_rtt + rtt_thresh:
+                self.css_baseline_min_rtt = self.current_round_min_rtt
+                self.css_rounds = 0
+                self.in_css = True
+        elif self.current_round_min_rtt < self.css_baseline_min_rtt:
+            # The RTT increase was spurious, back to plain slow start
+            self.css_baseline_min_rtt = math.inf
+            self.in_css = False
+        return False
@@ -0,0 +1,36 @@
+"""TCP Reno congestion control (RFC 5681)."""
+
+from common.cc.base import CongestionControl
+
+INITIAL_SSTHRESH = 16  # Segments
+
+
+class Reno(CongestionControl):
+    name = "reno"
+
+    def __init__(self, mss, initial_window=1):
+        self.mss = mss
+        self.cwnd = initial_window * mss
+        self.ssthresh = INITIAL_SSTHRESH * mss
+
+    def on_ack(self, acked, now, rtt, srtt, ack_seq, next_seq):
+        if self.cwnd < self.ssthresh:
+            # Slow start phase
+            self.cwnd += self.mss  # Increase by MSS for each ACK in slow start
+        else:
+            # Congestion avoidance phase
+            self.cwnd += self.mss * (
+                self.mss / self.cwnd
+            )  # Increase approximately 1 MSS per RTT
+
+    def on_loss(self, now):
+        self.ssthresh = max(self.cwnd // 2, 2 * self.mss)
+        # Inflate by the three segments the duplicate ACKs say have left
+        self.cwnd = self.ssthresh + 3 * self.mss
+
+    def on_recovery_end(self, now):
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, now):
+        self.ssthresh = max(self.cwnd // 2, 2 * self.mss)
+        self.cwnd = self.mss
@@ -0,0 +1,281 @@
+"""Congestion-control event traces, written as CSV or in binary.
+
+Each row is one event the controller saw (the connection opening, an ACK,
+a loss or a timeout) together with the algorithm and the window it
+produced, so a trace can be fed back into a fresh controller of the same
+kind and the two trajectories compared.
+
+CSV traces format every field as text on the send path, which slows a
+transfer down enough to change the dynamics being traced. Binary traces
+(any path ending in .bin) instead pack fixed-size records into a
+preallocated buffer, and a writer thread flushes full buffers to disk.
+read_trace reads both kinds, and trace_frames turns one into pandas
+DataFrames for plotting.
+"""
+
+import csv
+import math
+import queue
+import socket
+import struct
+import threading
+
+FIELDS = [
+    "conn",
+    "cc",
+    "mss",
+    "time",
+    "event",
+    "acked",
+    "delivered",
+    "rtt",
+    "srtt",
+    "ack_seq",
+    "next_seq",
+    "cwnd",
+    "ssthresh",
+]
+
+BINARY_SUFFIX = ".bin"
+BINARY_MAGIC = b"CCTRACE1"
+# time, event, algorithm, client IPv4 address and port, mss, acked, delivered,
+# ack_seq, next_seq, rtt and srtt (NaN when there is no sample), cwnd, ssthresh
+RECORD = struct.Struct("<dBB4sHHQQQQdddd")
+# "sack" is a duplicate ACK that only delivered SACKed data
+EVENTS = ["open", "ack", "loss", "recovery_end", "timeout", "sack"]
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+# Append new algorithms so that the codes of existing traces stay valid
+ALGORITHMS = ["reno", "cubic", "bbr"]
+ALGORITHM_CODES = {name: code for code, name in enumerate(ALGORITHMS)}
+RING_RECORDS = 4096  # Records per buffer; two buffers take turns
+
+
+class AckTrace:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+
+    def record(
+        self, conn, event, now, acked, delivered, rtt, srtt, ack_seq, next_seq, cc
+    ):
+        self.writer.writerow(
+            [
+                f"{conn[0]}:{conn[1]}",
+                cc.name,
+                cc.mss,
+                repr(now),
+                event,
+                acked,
+                delivered,
+                "" if rtt is None else repr(rtt),
+                "" if srtt is None else repr(srtt),
+                ack_seq,
+                next_seq,
+                repr(cc.cwnd),
+                repr(cc.ssthresh),
+            ]
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class BinaryTrace:
+    """Same interface as AckTrace, recording into fixed-size binary records.
+
+    Recording packs one record into the current buffer. When it is full,
+    the buffer is handed to a writer thread and recording carries on in
+    the other, so the send loop never waits on the disk unless the writer
+    falls a whole buffer behind. Records still buffered when the process
+    dies are lost, so call close().
+    """
+
+    def __init__(self, path, records=RING_RECORDS):
+        self.file = open(path, "wb")
+        self.file.write(BINARY_MAGIC)
+        self.capacity = records * RECORD.size
+        self.buffer = bytearray(self.capacity)
+        self.position = 0
+        self.free = queue.Queue()  # Buffers the writer has finished with
+        self.free.put(bytearray(self.capacity))
+        self.full = queue.Queue()  # (buffer, length) to write, None to stop
+        self.writer = threading.Thread(target=self.write_buffers, daemon=True)
+        self.writer.start()
+        self.addresses = {}  # Client address -> packed IPv4 address
+
+    def record(
+        self, conn, event, now, acked, delivered, rtt, srtt, ack_seq, next_seq, cc
+    ):
+        address = self.addresses.get(conn)
+        if address is None:
+            address = self.addresses[conn] = socket.inet_aton(conn[0])
+        RECORD.pack_into(
+            self.buffer,
+            self.position,
+            now,
+            EVENT_CODES[event],
+            ALGORITHM_CODES[cc.name],
+            address,
+            conn[1],
+            cc.mss,
+            acked,
+            delivered,
+            ack_seq,
+            next_seq,
+            math.nan if rtt is None else rtt,
+            math.nan if srtt is None else srtt,
+            cc.cwnd,
+            cc.ssthresh,
+        )
+        self.position += RECORD.size
+        if self.position == self.capacity:
+            self.full.put((self.buffer, self.position))
+            self.buffer = self.free.get()
+            self.position = 0
+
+    def write_buffers(self):
+        while True:
+            item = self.full.get()
+            if item is None:
+                return
+            buffer, length = item
+            self.file.write(memoryview(buffer)[:length])
+            self.free.put(buffer)
+
+    def close(self):
+        self.full.put((self.buffer, self.position))
+        self.full.put(None)
+        self.writer.join()
+        self.file.close()
+
+
+def open_trace(path):
+    """Binary trace for a path ending in .bin, otherwise CSV."""
+    if path.endswith(BINARY_SUFFIX):
+        return BinaryTrace(path)
+    return AckTrace(path)
+
+
+def is_binary_trace(path):
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def read_binary_records(path):
+    """The raw records of a binary trace, as one bytes object."""
+    with open(path, "rb") as f:
+        data = f.read()[len(BINARY_MAGIC) :]
+    # A trace cut short mid-write keeps its whole records
+    return data[: len(data) - len(data) % RECORD.size]
+
+
+def read_binary_trace(path):
+    """Yield the rows of a binary trace, as read_trace does for CSV."""
+    for record in RECORD.iter_unpack(read_binary_records(path)):
+        (
+            now,
+            event,
+            algorithm,
+            address,
+            port,
+            mss,
+            acked,
+            delivered,
+            ack_seq,
+            next_seq,
+            rtt,
+            srtt,
+            cwnd,
+            ssthresh,
+        ) = record
+        yield {
+            "conn": f"{socket.inet_ntoa(address)}:{port}",
+            "cc": ALGORITHMS[algorithm],
+            "mss": mss,
+            "time": now,
+            "event": EVENTS[event],
+            "acked": acked,
+            "delivered": delivered,
+            "rtt": None if math.isnan(rtt) else rtt,
+            "srtt": None if math.isnan(srtt) else srtt,
+            "ack_seq": ack_seq,
+            "next_seq": next_seq,
+            "cwnd": cwnd,
+            "ssthresh": ssthresh,
+        }
+
+
+def trace_frames(path):
+    """One pandas DataFrame per connection of a CSV or binary trace.
+
+    Keyed by "ip:port", with the columns of FIELDS except conn, plus
+    ``elapsed``, seconds since the connection's first event. Missing RTT
+    samples are NaN.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if is_binary_trace(path):
+        dtype = np.dtype(
+            [
+                ("time", "<f8"),
+                ("event", "u1"),
+                ("cc", "u1"),
+                ("address", "S4"),
+                ("port", "<u2"),
+                ("mss", "<u2"),
+                ("acked", "<u8"),
+                ("delivered", "<u8"),
+                ("ack_seq", "<u8"),
+                ("next_seq", "<u8"),
+                ("rtt", "<f8"),
+                ("srtt", "<f8"),
+                ("cwnd", "<f8"),
+                ("ssthresh", "<f8"),
+            ]
+        )
+        data = pd.DataFrame(np.frombuffer(read_binary_records(path), dtype))
+        data["event"] = pd.Categorical.from_codes(data["event"], EVENTS)
+        data["cc"] = pd.Categorical.from_codes(data["cc"], ALGORITHMS)
+        data["conn"] = [
+            f"{socket.inet_ntoa(address)}:{port}"
+            for address, port in zip(data.pop("address"), data.pop("port"))
+        ]
+    else:
+        data = pd.read_csv(path)
+        if "delivered" not in data:
+            # Written before delivered bytes were traced
+            data["delivered"] = 0
+        if "cc" not in data:
+            # Written before the algorithm was traced
+            data["cc"] = None
+    data = data[FIELDS]
+    frames = {}
+    for conn, frame in data.groupby("conn", sort=False):
+        frame = frame.drop(columns="conn").reset_index(drop=True)
+        frame["elapsed"] = frame["time"] - frame["time"].iloc[0]
+        frames[conn] = frame
+    return frames
+
+
+def read_trace(path):
+    """Yield the rows of a CSV or binary trace with numeric fields converted."""
+    if is_binary_trace(path):
+        yield from read_binary_trace(path)
+        return
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            # None for a trace written before the algorithm was recorded
+            row["cc"] = row.get("cc") or None
+            row["mss"] = int(row["mss"])
+            row["time"] = float(row["time"])
+            row["acked"] = int(row["acked"])
+            row["delivered"] = int(row.get("delivered") or 0)
+            row["rtt"] = float(row["rtt"]) if row["rtt"] else None
+            row["srtt"] = float(row["srtt"]) if row["srtt"] else None
+            row["ack_seq"] = int(row["ack_seq"])
+            row["next_seq"] = int(row["next_seq"])
+            row["cwnd"] = float(row["cwnd"])
+            row["ssthresh"] = float(row["ssthresh"])
+            yield row
@@ -0,0 +1,61 @@
+"""Sidecar file recording the progress of a partial download.
+
+The file holds the size and version the sender announced and every byte
+range already on disk. It is only rewritten after the output has been
+synced, and replaced atomically, so it never claims data the disk may
+not hold. A download that is restarted reads it back to tell the sender
+where to resume.
+"""
+
+import os
+import struct
+
+SUFFIX = ".checkpoint"
+MAGIC = b"UDPCKPT1"
+HEADER = struct.Struct("!8sQQI")  # magic, file size, file version, ranges
+RANGE = struct.Struct("!QQ")
+
+
+def checkpoint_path(output_file, stripe=None):
+    """Sidecar of a download; each stripe (index, count) gets its own."""
+    if stripe is None:
+        return output_file + SUFFIX
+    index, count = stripe
+    return f"{output_file}{SUFFIX}.{index}-of-{count}"
+
+
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return (size, version, ranges), or None if there is no usable one."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, size, version, count = HEADER.unpack_from(data)
+        if magic != MAGIC or len(data) != HEADER.size + count * RANGE.size:
+            return None
+        ranges = list(RANGE.iter_unpack(data[HEADER.size :]))
+        return size, version, ranges
+
+    def save(self, size, version, ranges):
+        ranges = list(ranges)
+        data = HEADER.pack(MAGIC, size, version, len(ranges))
+        data += b"".join(RANGE.pack(start, end) for start, end in ranges)
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,90 @@
+"""Whole-file digest exchanged when a transfer ends.
+
+Both ends hash the file exactly once, in order, while it streams: the
+sender as each segment first goes out, the receiver as its in-order prefix
+grows. Alongside the SHA-256 of the whole file, a CRC-32 per block lets a
+receiver whose digest disagrees find the blocks that differ and fetch
+only those again. The sender's end packet carries both.
+"""
+
+import hashlib
+import os
+import struct
+import zlib
+
+from common.packet import ProtocolError
+
+MAX_BLOCKS = 256  # So the block CRCs fit the end packet of any segment size
+MIN_BLOCK_SIZE = 64 * 1024
+READ_SIZE = 1024 * 1024  # Read-back chunk for data written out of order
+
+DIGEST = struct.Struct("!32s")  # SHA-256, followed by one BLOCK_CRC per block
+BLOCK_CRC = struct.Struct("!I")
+
+
+def block_size(file_size):
+    return max(MIN_BLOCK_SIZE, -(-file_size // MAX_BLOCKS))
+
+
+class FileDigest:
+    """SHA-256 and per-block CRC-32 of a file fed to it front to back."""
+
+    def __init__(self, file_size):
+        self.size = file_size
+        self.block_size = block_size(file_size)
+        self.sha = hashlib.sha256()
+        self.end = 0  # Length of the prefix hashed so far
+        self.blocks = []  # CRC of every completed block
+        self.block_crc = 0  # Running CRC of the block in progress
+
+    def update(self, data):
+        """Hash the bytes that follow the prefix hashed so far."""
+        self.sha.update(data)
+        view = memoryview(data)
+        while view:
+            room = self.block_size - self.end % self.block_size
+            self.block_crc = zlib.crc32(view[:room], self.block_crc)
+            self.end += len(view[:room])
+            view = view[room:]
+            if self.end % self.block_size == 0:
+                self.blocks.append(self.block_crc)
+                self.block_crc = 0
+
+    def update_from(self, fd, end, base=0):
+        """Hash the file behind ``fd`` up to ``end``, reading it back.
+
+        Offsets are relative to ``base``, where the hashed range starts.
+        """
+        while self.end < end:
+            length = min(READ_SIZE, end - self.end)
+            self.update(os.pread(fd, length, base + self.end))
+
+    def block_crcs(self):
+        if self.end % self.block_size:
+            return self.blocks + [self.block_crc]
+        return self.blocks
+
+    def block_range(self, index):
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.size)
+
+    def pack(self):
+        """End-packet payload: the SHA-256, then every block's CRC."""
+        crcs = self.block_crcs()
+        return DIGEST.pack(self.sha.digest()) + struct.pack(f"!{len(crcs)}I", *crcs)
+
+    def mismatched_blocks(self, payload):
+        """Indexes of the blocks whose CRC differs from the sender's payload.
+
+        Empty if the whole-file digests agree. If only the SHA-256 differs,
+        the CRCs cannot say where, so every block is reported.
+        """
+        if len(payload) < DIGEST.size or (len(payload) - DIGEST.size) % BLOCK_CRC.size:
+            raise ProtocolError("malformed file digest")
+        (sha,) = DIGEST.unpack_from(payload)
+        if sha == self.sha.digest():
+            return []
+        theirs = [crc for (crc,) in BLOCK_CRC.iter_unpack(payload[DIGEST.size :])]
+        ours = self.block_crcs()
+        bad = [i for i, crc in enumerate(theirs) if i >= len(ours) or ours[i] != crc]
+        return bad or list(range(len(theirs)))
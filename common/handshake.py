@@ -0,0 +1,198 @@
+"""Connection handshake of the congestion-controlled transfers.
+
+The client's start packet offers the largest segment it accepts, how many
+segments it can buffer and the checksum algorithms it supports. The
+server answers with probes: one start reply per candidate segment size,
+each padded to a full segment and sent with Don't Fragment set, largest
+first. The client adopts the size of the first probe that reaches it and
+echoes it back, which settles the segment size at the largest the path
+carried (path-MTU probing in the spirit of RFC 8899). The reply also
+carries the file size, the initial window and the checksum algorithm.
+
+A client resuming a partial download also sends the size and version of
+the file it was fetching, with what it already holds; if the file is
+unchanged, the transfer starts past that.
+"""
+
+import errno
+import socket
+import sys
+import time
+
+from common.packet import (
+    CHECKSUM_NONE,
+    FLAG_ACK,
+    FLAG_START,
+    HEADER_SIZE,
+    SUPPORTED_CHECKSUMS,
+    ProtocolError,
+    create_handshake_info,
+    parse_hello,
+    parse_mss_echo,
+    parse_packet,
+    send_packet,
+)
+
+IP_UDP_OVERHEAD = 28  # IPv4 and UDP headers
+BASE_MSS = 1400  # Always offered, small enough for tunnels and VPNs
+MIN_MSS = 1232  # IPv6 minimum MTU; also leaves room for the file digest
+PROBE_MTUS = (9000, 1500)  # Jumbo frames, then plain Ethernet
+INITIAL_WINDOW = 10  # Segments (RFC 6928)
+INITIAL_RTO = 1.0  # Before the echo has given an RTT sample (RFC 6298)
+MAX_RTO = 60.0
+# Seconds without a datagram from a client before its connection is given
+# up; a live client re-ACKs at least every few seconds while it waits
+IDLE_TIMEOUT = 15.0
+
+# Linux socket options Python does not export: set Don't Fragment on every
+# datagram without being limited by the kernel's cached path MTU
+IP_MTU_DISCOVER = 10
+IP_PMTUDISC_PROBE = 3
+
+
+def mss_for_mtu(mtu):
+    return mtu - IP_UDP_OVERHEAD - HEADER_SIZE
+
+
+MAX_MSS = mss_for_mtu(PROBE_MTUS[0])
+
+
+def probe_sizes(limit):
+    """Candidate segment sizes up to ``limit``, largest first."""
+    sizes = [mss_for_mtu(mtu) for mtu in PROBE_MTUS if mss_for_mtu(mtu) <= limit]
+    sizes.append(min(BASE_MSS, limit))
+    return sorted(set(sizes), reverse=True)
+
+
+def choose_checksum(offered):
+    """Strongest checksum algorithm both ends support."""
+    common = offered & SUPPORTED_CHECKSUMS
+    return common.bit_length() - 1 if common else CHECKSUM_NONE
+
+
+def enable_pmtu_probing(sock):
+    """Send with Don't Fragment so oversized probes are dropped, not split."""
+    if sys.platform.startswith("linux"):
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE)
+
+
+class Handshake:
+    """Server side of the handshake for one client, in front of its Sender.
+
+    ``connect(mss, initial_window, checksum, start_info)`` builds the Sender
+    once the client has confirmed a segment size; from then on every call
+    is passed straight through to it.
+    """
+
+    def __init__(
+        self, server_socket, client_address, source, max_mss, initial_window, connect
+    ):
+        self.server_socket = server_socket
+        self.client_address = client_address
+        self.source = source
+        self.max_mss = max_mss
+        self.initial_window = initial_window
+        self.connect = connect
+        self.checksum = CHECKSUM_NONE
+        self.resume = None  # (offset, held ranges) the client already has
+        self.probes = []  # Candidate segment sizes, largest first
+        self.probe_time = None
+        self.rto = INITIAL_RTO
+        self.resent = False  # Karn's rule: no RTT sample once probes repeat
+        self.sender = None
+        self.last_heard = time.monotonic()
+        self.abandoned = False  # The client went silent mid-handshake
+
+    @property
+    def done(self):
+        return self.abandoned or (self.sender is not None and self.sender.done)
+
+    def start(self, packet):
+        _, _, _, payload = parse_packet(packet)
+        max_mss, window, checksums, resume = parse_hello(payload)
+        if min(max_mss, self.max_mss) < MIN_MSS:
+            raise ProtocolError(f"segment size {max_mss} is below {MIN_MSS}")
+        self.probes = probe_sizes(min(max_mss, self.max_mss))
+        if window:
+            self.initial_window = max(1, min(self.initial_window, window))
+        self.checksum = choose_checksum(checksums)
+        size, version, offset, held = resume
+        if version and (size, version) == (self.source.size, self.source.version):
+            self.resume = offset, held
+        self.send_probes(time.monotonic())
+
+    def send_probes(self, now):
+        for mss in self.probes:
+            info = create_handshake_info(
+                self.source.size,
+                mss,
+                self.initial_window,
+                self.checksum,
+                self.source.version,
+                self.source.offset,
+                pad=True,
+            )
+            try:
+                send_packet(
+                    self.server_socket, self.client_address, 0, info, start=True
+                )
+            except OSError as e:
+                # Larger than the outgoing interface carries
+                if e.errno != errno.EMSGSIZE:
+                    raise
+        self.probe_time = now
+
+    def on_packet(self, packet):
+        if self.sender is not None:
+            self.sender.on_packet(packet)
+            return
+        now = self.last_heard = time.monotonic()
+        flags, _, _, payload = parse_packet(packet)
+        if not flags & FLAG_START:
+            return
+        if not flags & FLAG_ACK:
+            # The client is still waiting for a probe to get through
+            self.resent = True
+            self.send_probes(now)
+            return
+        mss = parse_mss_echo(payload)
+        if mss not in self.probes:
+            raise ProtocolError(f"client confirmed a segment size of {mss}")
+        self.establish(mss, now)
+
+    def establish(self, mss, now):
+        # logging.info(f"{self.client_address}: segment size {mss}")
+        info = create_handshake_info(
+            self.source.size,
+            mss,
+            self.initial_window,
+            self.checksum,
+            self.source.version,
+            self.source.offset,
+        )
+        self.sender = self.connect(mss, self.initial_window, self.checksum, info)
+        if self.resume is not None:
+            self.sender.skip_ahead(*self.resume)
+        if not self.resent:
+            self.sender.rtt_manager.update_rtt(now - self.probe_time)
+        self.sender.start()
+
+    def send_window(self):
+        if self.sender is not None:
+            self.sender.send_window()
+
+    def deadline(self):
+        if self.sender is not None:
+            return self.sender.deadline()
+        return min(self.probe_time + self.rto, self.last_heard + IDLE_TIMEOUT)
+
+    def check_timeout(self, now):
+        if self.sender is not None:
+            self.sender.check_timeout(now)
+        elif now >= self.last_heard + IDLE_TIMEOUT:
+            # logging.info(f"{self.client_address}: gave up on the handshake")
+            self.abandoned = True
+        elif now >= self.probe_time + self.rto:
+            self.rto = min(MAX_RTO, self.rto * 2)
+            self.resent = True
+            self.send_probes(now)
@@ -0,0 +1,80 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalSet:
+    """Sorted, disjoint set of half-open byte ranges [start, end).
+
+    Adjacent and overlapping ranges are merged on insert, so an in-order
+    transfer is tracked by a single range however large the file is.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, start, end):
+        """Insert [start, end) and return the number of bytes that were new."""
+        if end <= start:
+            return 0
+        # Every range touching or overlapping [start, end) gets merged
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        added = end - start
+        for i in range(lo, hi):
+            added -= max(0, min(end, self.ends[i]) - max(start, self.starts[i]))
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+        return added
+
+    def __contains__(self, offset):
+        i = bisect_right(self.starts, offset) - 1
+        return i >= 0 and offset < self.ends[i]
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def contiguous_end(self, start=0):
+        """End of the run beginning at ``start``, or ``start`` if it is missing."""
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and start < self.ends[i]:
+            return self.ends[i]
+        return start
+
+    def ranges_after(self, offset, limit):
+        """Up to ``limit`` ranges starting beyond ``offset``, lowest first."""
+        i = bisect_right(self.starts, offset)
+        return list(zip(self.starts[i : i + limit], self.ends[i : i + limit]))
+
+    def remove(self, start, end):
+        """Forget [start, end), splitting any range that straddles it."""
+        if end <= start:
+            return
+        lo = bisect_right(self.ends, start)
+        hi = bisect_left(self.starts, end)
+        if lo >= hi:
+            return
+        kept = []
+        if self.starts[lo] < start:
+            kept.append((self.starts[lo], start))
+        if self.ends[hi - 1] > end:
+            kept.append((end, self.ends[hi - 1]))
+        self.starts[lo:hi] = [s for s, _ in kept]
+        self.ends[lo:hi] = [e for _, e in kept]
+
+    def discard_below(self, offset):
+        """Forget ranges that end at or before ``offset``."""
+        i = bisect_right(self.ends, offset)
+        del self.starts[:i]
+        del self.ends[:i]
+
+    def total(self):
+        return sum(end - start for start, end in self)
+
+    def max_end(self):
+        return self.ends[-1] if self.ends else 0
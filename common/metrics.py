@@ -0,0 +1,206 @@
+"""Live per-connection statistics in Prometheus text format.
+
+Every Sender can keep a ConnectionStats, which the send path updates with
+plain attribute increments, so keeping one costs next to nothing. A Metrics
+registry holds the stats of live connections and the totals of finished
+ones. A MetricsServer renders them from a background thread whenever it is
+asked, over HTTP on a TCP port or on a Unix socket, so transfers can be
+watched while they run without any per-packet logging.
+"""
+
+import http.server
+import os
+import socketserver
+import stat
+import threading
+
+PREFIX = "udp_transfer"
+
+# Counter attribute -> help text
+COUNTERS = {
+    "bytes_sent": "Bytes sent, headers and retransmissions included",
+    "segments_sent": "Data segments sent, retransmissions included",
+    "retransmits": "Segments sent more than once",
+    "timeouts": "Retransmission timeouts that collapsed the window",
+    "fast_recoveries": "Fast recoveries entered on duplicate ACKs",
+    "repairs": "Resends of blocks the client's digest check rejected",
+}
+# Gauge attribute -> (metric name, help text)
+GAUGES = {
+    "srtt": ("srtt_seconds", "Smoothed round-trip time"),
+    "cwnd": ("cwnd_bytes", "Congestion window"),
+    "ssthresh": ("ssthresh_bytes", "Slow-start threshold"),
+}
+
+
+class ConnectionStats:
+    """Counters and the latest window state of one connection."""
+
+    def __init__(self, client, registry=None):
+        self.client = client  # "ip:port" of the receiver
+        self.registry = registry
+        self.bytes_sent = 0
+        self.segments_sent = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.fast_recoveries = 0
+        self.repairs = 0
+        self.srtt = None  # Until the first RTT sample
+        self.cwnd = 0.0
+        self.ssthresh = float("inf")
+
+    def close(self):
+        """The transfer has finished: fold its counters into the totals."""
+        if self.registry is not None:
+            self.registry.close(self)
+
+
+class Metrics:
+    """Registry of the stats of every connection a server has accepted.
+
+    The send loop opens and closes stats while a MetricsServer thread
+    renders them, so the set of live connections is guarded by a lock; the
+    counters themselves are only ever written by the send loop.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.live = set()
+        self.finished = ConnectionStats(None)  # Counters summed over closed ones
+        self.connections = 0
+
+    def open(self, client_address):
+        stats = ConnectionStats(f"{client_address[0]}:{client_address[1]}", self)
+        with self.lock:
+            self.live.add(stats)
+            self.connections += 1
+        return stats
+
+    def close(self, stats):
+        with self.lock:
+            if stats not in self.live:
+                return
+            self.live.discard(stats)
+            for name in COUNTERS:
+                setattr(
+                    self.finished,
+                    name,
+                    getattr(self.finished, name) + getattr(stats, name),
+                )
+
+    def render(self):
+        """Every metric, in the Prometheus text exposition format."""
+        with self.lock:
+            live = sorted(self.live, key=lambda stats: stats.client)
+            finished = {name: getattr(self.finished, name) for name in COUNTERS}
+            connections = self.connections
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}.")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{PREFIX}_{name}{labels} {format_value(value)}")
+
+        metric(
+            "connections_active", "gauge", "Connections being served", [("", len(live))]
+        )
+        metric(
+            "connections_total", "counter", "Connections accepted", [("", connections)]
+        )
+        for name, help_text in COUNTERS.items():
+            total = finished[name] + sum(getattr(stats, name) for stats in live)
+            metric(
+                f"{name}_total",
+                "counter",
+                f"{help_text}, over all connections",
+                [("", total)],
+            )
+        for name, help_text in COUNTERS.items():
+            metric(
+                f"connection_{name}_total",
+                "counter",
+                f"{help_text}, per live connection",
+                [
+                    (f'{{client="{stats.client}"}}', getattr(stats, name))
+                    for stats in live
+                ],
+            )
+        for attribute, (name, help_text) in GAUGES.items():
+            metric(
+                f"connection_{name}",
+                "gauge",
+                f"{help_text}, per live connection",
+                [
+                    (f'{{client="{stats.client}"}}', getattr(stats, attribute))
+                    for stats in live
+                    if getattr(stats, attribute) is not None
+                ],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Answers every GET with the current metrics."""
+
+    def do_GET(self):
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # A scrape every few seconds would drown the server's own output
+        pass
+
+
+class TCPMetricsServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class UnixMetricsServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """Serves ``metrics`` over HTTP from a background thread.
+
+    ``address`` is a TCP port, as ``PORT`` or ``HOST:PORT`` (the host
+    defaults to 127.0.0.1), or else the path of a Unix socket to create,
+    which ``curl --unix-socket PATH http://localhost/metrics`` reads.
+    """
+
+    def __init__(self, address, metrics):
+        self.path = None
+        host, _, port = address.rpartition(":")
+        if port.isdigit():
+            self.server = TCPMetricsServer(
+                (host or "127.0.0.1", int(port)), MetricsHandler
+            )
+        else:
+            self.path = address
+            try:
+                if stat.S_ISSOCK(os.stat(address).st_mode):
+                    # Left behind by a server that did not exit cleanly
+                    os.remove(address)
+            except FileNotFoundError:
+                pass
+            self.server = UnixMetricsServer(address, MetricsHandler)
+        self.server.metrics = metrics
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.path is not None:
+            os.remove(self.path)
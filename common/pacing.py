@@ -0,0 +1,88 @@
+class PacingStats:
+    """Achieved against target sending rate while paced, over all transfers.
+
+    Only stretches where the pacer, rather than the window, set the pace
+    are counted, and without the full bucket each stretch starts with:
+    those bytes leave at once, so counting them would overstate the rate.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.target_bytes = 0.0  # Integral of the target rate over elapsed
+
+    def record(self, size, interval, rate):
+        self.bytes += size
+        self.elapsed += interval
+        self.target_bytes += rate * interval
+
+    def achieved_rate(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def target_rate(self):
+        return self.target_bytes / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"paced {self.bytes:.0f} bytes at {self.achieved_rate() / 1e6:.2f} MB/s "
+            f"(target {self.target_rate() / 1e6:.2f} MB/s)"
+        )
+
+
+class Pacer:
+    """Token bucket spreading sends at a target rate.
+
+    Tokens are bytes, refilled at ``rate`` bytes per second and capped at
+    ``burst``, so no more than ``burst`` bytes ever leave back to back.
+    Times come from the caller's monotonic clock. With no rate set,
+    sending is never delayed. ``pace_window`` asks the sender to pace
+    controllers that set no rate of their own at cwnd / srtt.
+    """
+
+    def __init__(self, burst, pace_window=False, stats=None):
+        self.burst = burst
+        self.pace_window = pace_window
+        self.stats = stats
+        self.tokens = burst
+        self.rate = None
+        self.stamp = None
+        self.last_send = None  # Of the current stretch of paced sends
+        self.allowance = 0.0  # What is left of the bucket the stretch began with
+
+    def refill(self, now):
+        if self.rate is not None and self.stamp is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def set_rate(self, rate, now):
+        self.refill(now)
+        if rate is None:
+            self.tokens = self.burst
+            self.last_send = None
+        self.rate = rate
+
+    def delay(self, size, now):
+        """Seconds until ``size`` bytes may be sent; 0 if they may go now."""
+        if self.rate is None:
+            return 0.0
+        self.refill(now)
+        if self.tokens >= size:
+            return 0.0
+        return (size - self.tokens) / self.rate
+
+    def idle(self):
+        """The sender ran out of window, not tokens; the gap until its next
+        send is not the pacer's doing, so it is left out of the stats."""
+        self.last_send = None
+
+    def consume(self, size, now):
+        if self.rate is None:
+            return
+        if self.last_send is None:
+            self.allowance = self.tokens
+        paced = max(0.0, size - self.allowance)
+        self.allowance = max(0.0, self.allowance - size)
+        self.tokens -= size
+        if self.stats is not None and self.last_send is not None:
+            self.stats.record(paced, now - self.last_send, self.rate)
+        self.last_send = now
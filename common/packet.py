@@ -0,0 +1,224 @@
+"""Binary wire format used by every sender and receiver.
+
+Each datagram is a fixed 24-byte header followed by the raw payload:
+
+    version (B) | flags (B) | length (H) | seq_num (Q) | ack_num (Q) | checksum (I)
+
+Data packets carry their byte offset in ``seq_num``; ACKs set ``FLAG_ACK``
+and carry the cumulative acknowledgement in ``ack_num``. ``checksum`` covers
+the header (with the checksum itself zeroed) and payload of data packets
+when the handshake negotiated an algorithm, and is 0 otherwise.
+"""
+
+import struct
+import zlib
+
+try:
+    # Optional: hardware-accelerated CRC32C
+    import crc32c
+except ImportError:
+    crc32c = None
+
+# Version 1 was the old JSON encoding, which always starts with "{";
+# version 2 started transfers without negotiating the segment size,
+# version 3 had no checksum field, and version 4 had no range offset in the
+# handshake reply.
+PROTOCOL_VERSION = 5
+LEGACY_JSON_MARKER = ord("{")
+
+HEADER = struct.Struct("!BBHQQI")
+HEADER_SIZE = HEADER.size
+
+# Payload of the server's start reply: the total file size in bytes
+START_INFO = struct.Struct("!Q")
+
+# Handshake of the congestion-controlled transfers. The client's start
+# packet offers the largest segment it accepts, the segments it can buffer
+# (0 for no limit) and a bitmask of the checksum algorithms it supports.
+# A client resuming a partial download adds the size and version of the
+# file it was fetching and the offset it holds everything below, followed
+# by SACK_BLOCKs of the ranges it holds beyond; all zero on a fresh start
+HELLO = struct.Struct("!HHBQQQ")
+# The server answers with the size of what it sends, segment size, initial
+# window, checksum algorithm, file version and the offset in the file where
+# what it sends starts (0 unless it sends one stripe of a striped
+# transfer), padded with zeros to a full segment when it probes
+HANDSHAKE_INFO = struct.Struct("!QHHBQQ")
+# The client confirms the segment size it adopted
+MSS_ECHO = struct.Struct("!H")
+
+# Checksum algorithms, by the bit each one takes in the HELLO bitmask; a
+# higher bit is a stronger algorithm. Each maps to crc(data, value) -> int
+CHECKSUM_NONE = 0
+CHECKSUM_CRC32 = 1
+CHECKSUM_CRC32C = 2
+CHECKSUMS = {CHECKSUM_NONE: None, CHECKSUM_CRC32: zlib.crc32}
+if crc32c is not None:
+    CHECKSUMS[CHECKSUM_CRC32C] = crc32c.crc32c
+SUPPORTED_CHECKSUMS = sum(1 << algorithm for algorithm in CHECKSUMS)
+
+# ACK payload: selective acknowledgement blocks of received byte ranges
+# [start, end) above the cumulative ACK, lowest first
+SACK_BLOCK = struct.Struct("!QQ")
+MAX_SACK_BLOCKS = 16
+
+FLAG_START = 0x01
+FLAG_END = 0x02
+FLAG_ACK = 0x04
+FLAG_RESET = 0x08
+FLAG_REPAIR = 0x10  # ACK from a client whose whole-file digest disagreed
+
+
+class ProtocolError(ValueError):
+    """Raised when a datagram does not follow this wire format."""
+
+
+class IncompatiblePeer(ProtocolError):
+    """Raised when the peer speaks another protocol version or has reset
+    the connection, so no further datagram from it will make sense."""
+
+
+def create_packet(seq_num, data=b"", start=False, end=False, ack_num=0, flags=0):
+    if start:
+        flags |= FLAG_START
+    if end:
+        flags |= FLAG_END
+    return HEADER.pack(PROTOCOL_VERSION, flags, len(data), seq_num, ack_num, 0) + data
+
+
+def send_packet(sock, address, seq_num, data=b"", start=False, end=False, crc=None):
+    """Send a data packet without copying the payload into a new buffer.
+
+    The header and payload (any bytes-like object, typically a memoryview
+    into the mapped source file) go out as one datagram via sendmsg.
+    ``crc`` is the negotiated checksum function, if any.
+    """
+    flags = (FLAG_START if start else 0) | (FLAG_END if end else 0)
+    header = HEADER.pack(PROTOCOL_VERSION, flags, len(data), seq_num, 0, 0)
+    if crc is not None:
+        checksum = crc(data, crc(header))
+        header = HEADER.pack(PROTOCOL_VERSION, flags, len(data), seq_num, 0, checksum)
+    try:
+        return sock.sendmsg([header, data], [], 0, address)
+    except (BlockingIOError, InterruptedError):
+        # Send buffer of a non-blocking socket is full: the datagram is
+        # lost like any other drop and recovered by retransmission
+        return 0
+
+
+def create_ack(ack_num, end=False, sack_blocks=(), repair=False):
+    data = b"".join(SACK_BLOCK.pack(start, stop) for start, stop in sack_blocks)
+    flags = FLAG_ACK | (FLAG_REPAIR if repair else 0)
+    return create_packet(0, data, ack_num=ack_num, end=end, flags=flags)
+
+
+def create_hello(max_mss, window, checksums=SUPPORTED_CHECKSUMS, resume=None):
+    """``resume`` is (size, version, offset, held ranges), or None."""
+    size, version, offset, held = resume or (0, 0, 0, ())
+    data = HELLO.pack(max_mss, window, checksums, size, version, offset)
+    data += b"".join(SACK_BLOCK.pack(start, end) for start, end in held)
+    return create_packet(0, data, start=True)
+
+
+def create_mss_echo(mss):
+    return create_packet(0, MSS_ECHO.pack(mss), start=True, flags=FLAG_ACK)
+
+
+def create_handshake_info(
+    file_size, mss, window, checksum, version, offset=0, pad=False
+):
+    """Payload of the server's start reply; ``pad`` fills a whole segment."""
+    info = HANDSHAKE_INFO.pack(file_size, mss, window, checksum, version, offset)
+    if pad:
+        info += bytes(mss - len(info))
+    return info
+
+
+def parse_hello(payload):
+    """Return (max_mss, window, checksums, resume) from a client's start
+    packet, with resume as create_hello takes it."""
+    if len(payload) < HELLO.size or (len(payload) - HELLO.size) % SACK_BLOCK.size:
+        raise ProtocolError("malformed handshake offer")
+    max_mss, window, checksums, size, version, offset = HELLO.unpack_from(payload)
+    held = list(SACK_BLOCK.iter_unpack(payload[HELLO.size :]))
+    return max_mss, window, checksums, (size, version, offset, held)
+
+
+def parse_handshake_info(payload):
+    """Return (file_size, mss, window, checksum, version, offset), ignoring
+    padding."""
+    if len(payload) < HANDSHAKE_INFO.size:
+        raise ProtocolError("malformed handshake reply")
+    return HANDSHAKE_INFO.unpack_from(payload)
+
+
+def parse_mss_echo(payload):
+    if len(payload) != MSS_ECHO.size:
+        raise ProtocolError("malformed segment size confirmation")
+    (mss,) = MSS_ECHO.unpack(payload)
+    return mss
+
+
+def create_reset():
+    return create_packet(0, flags=FLAG_RESET)
+
+
+def check_version(packet):
+    """Reject datagrams from peers speaking another protocol version."""
+    if not packet:
+        raise ProtocolError("empty datagram")
+    if packet[0] == LEGACY_JSON_MARKER:
+        raise IncompatiblePeer("peer uses the legacy JSON encoding")
+    if packet[0] != PROTOCOL_VERSION:
+        raise IncompatiblePeer(f"unsupported protocol version {packet[0]}")
+
+
+def parse_packet(packet):
+    """Return (flags, seq_num, ack_num, payload) for a received datagram."""
+    check_version(packet)
+    if len(packet) < HEADER_SIZE:
+        raise ProtocolError("truncated header")
+    _, flags, length, seq_num, ack_num, _ = HEADER.unpack_from(packet)
+    if flags & FLAG_RESET:
+        raise IncompatiblePeer("connection reset by peer")
+    payload = memoryview(packet)[HEADER_SIZE : HEADER_SIZE + length]
+    if len(payload) != length:
+        raise ProtocolError("truncated payload")
+    return flags, seq_num, ack_num, payload
+
+
+def checksum_matches(packet, crc):
+    """True if a data packet's checksum agrees with its header and payload.
+
+    Works on the raw datagram, before parse_packet, so a corrupted header
+    fails the check instead of being taken at its word.
+    """
+    if len(packet) < HEADER_SIZE:
+        return False
+    version, flags, length, seq_num, ack_num, checksum = HEADER.unpack_from(packet)
+    header = HEADER.pack(version, flags, length, seq_num, ack_num, 0)
+    payload = memoryview(packet)[HEADER_SIZE : HEADER_SIZE + length]
+    return len(payload) == length and crc(payload, crc(header)) == checksum
+
+
+def is_unchecksummed(packet):
+    """True for the datagrams a sender never checksums: handshake replies,
+    which go out before a checksum is settled, and resets."""
+    if len(packet) < HEADER_SIZE:
+        return False
+    _, flags, length, _, _, checksum = HEADER.unpack_from(packet)
+    return checksum == 0 and bool(
+        flags & FLAG_START or (flags == FLAG_RESET and length == 0)
+    )
+
+
+def get_seq_no_from_ack_pkt(ack_packet):
+    flags, _, ack_num, _ = parse_packet(ack_packet)
+    return ack_num, bool(flags & FLAG_END)
+
+
+def parse_sack(payload):
+    """Return the (start, end) SACK blocks carried in an ACK payload."""
+    if len(payload) % SACK_BLOCK.size:
+        raise ProtocolError("malformed SACK blocks")
+    return list(SACK_BLOCK.iter_unpack(payload))
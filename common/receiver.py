@@ -0,0 +1,357 @@
+"""Receiver shared by the congestion-controlled clients.
+
+The receiver does the client's half of the handshake, writes segments at
+their offsets into a FileSink (in or out of order), answers each with a
+cumulative ACK and SACK blocks, drops segments that fail the negotiated
+checksum, checks the finished file against the sender's digest (fetching
+the blocks that differ again) and keeps a checkpoint so an interrupted
+download resumes. The sender picks the congestion controller, so the
+Reno and CUBIC clients are the same program.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+from collections import defaultdict
+
+from common.aio import receive
+from common.checkpoint import Checkpoint, checkpoint_path
+from common.handshake import MAX_MSS
+from common.packet import (
+    CHECKSUMS,
+    FLAG_END,
+    FLAG_START,
+    HEADER_SIZE,
+    MAX_SACK_BLOCKS,
+    IncompatiblePeer,
+    ProtocolError,
+    checksum_matches,
+    create_ack,
+    create_hello,
+    create_mss_echo,
+    is_unchecksummed,
+    parse_handshake_info,
+    parse_packet,
+)
+from common.session import receive_session
+from common.sink import FileSink
+from common.stripes import receive_striped
+
+# Constants
+TIMEOUT = 2
+OUTPUT_FILE = "received_file.txt"
+PROGRESS_INTERVAL = 1.0  # Seconds between progress reports
+LINGER = 2 * TIMEOUT  # Seconds to stay behind re-ACKing a repeated end packet
+
+
+class Receiver:
+    """Receiving end of one transfer, shared by the Reno and CUBIC clients."""
+
+    def __init__(self, max_mss=MAX_MSS, window=0, progress=False):
+        self.max_mss = max_mss  # Largest segment we offer to receive
+        self.window = window  # Segments we offer to buffer, 0 for no limit
+        self.mss = None  # Segment size, settled by the handshake
+        self.crc = None  # Negotiated per-segment checksum function, if any
+        self.corrupted = 0  # Segments dropped for a bad checksum
+        self.repairing = False  # Fetching blocks the file digest flagged
+        self.data_seen = False
+        self.expected_seq_num = 0
+        self.sink = None  # Output file, written at each packet's offset
+        self.duplicate_ack_count = defaultdict(int)
+        self.progress = progress
+        self.next_report = 0.0
+
+    def send_ack(self, client_socket, server_address, seq_num):
+        """Send cumulative acknowledgment, with SACK blocks for data beyond it"""
+        if seq_num == -1:
+            ack_packet = create_ack(0, end=True)
+        else:
+            sack_blocks = self.sink.received.ranges_after(seq_num, MAX_SACK_BLOCKS)
+            ack_packet = create_ack(
+                seq_num, sack_blocks=sack_blocks, repair=self.repairing
+            )
+        client_socket.sendto(ack_packet, server_address)
+        # logging.info(f"Sent ACK for sequence number {seq_num}")
+
+    def send_start(self, client_socket, server_address):
+        """Send (or resend) the connection request, or our confirmation once
+        the server's handshake reply has settled the segment size"""
+        if self.mss is None:
+            packet = create_hello(
+                self.max_mss, self.window, resume=self.sink.resume_offer()
+            )
+        else:
+            packet = create_mss_echo(self.mss)
+        client_socket.sendto(packet, server_address)
+        # logging.info("Sent initial connection request")
+
+    def handle_packet(self, client_socket, server_address, packet):
+        """Process one packet from the server; return True once the file is complete
+
+        Raises IncompatiblePeer if the server speaks another protocol
+        version or resets the connection. Any other malformed datagram is
+        a stray or a mangled one, and is ignored like a lost one.
+        """
+        try:
+            return self.process_packet(client_socket, server_address, packet)
+        except IncompatiblePeer:
+            raise
+        except ProtocolError as e:
+            logging.debug(f"Ignoring malformed datagram: {e}")
+            return False
+
+    def process_packet(self, client_socket, server_address, packet):
+        if (
+            self.crc is not None
+            and not is_unchecksummed(packet)
+            and not checksum_matches(packet, self.crc)
+        ):
+            # Checked before the header is trusted, since it may be the
+            # corrupted part; dropped like a lost segment, so only it is
+            # sent again
+            self.corrupted += 1
+            return False
+        flags, seq_num, _, data = parse_packet(packet)
+        end = flags & FLAG_END
+        # logging.info(f"Received packet with seq_num {seq_num}")
+
+        if flags & FLAG_START:
+            # Handshake probe: the first to get through sets the segment
+            # size, and the announced file size lets us reserve space (or
+            # keep what an earlier run of this download left)
+            if self.mss is None:
+                file_size, self.mss, _, checksum, version, offset = (
+                    parse_handshake_info(data)
+                )
+                self.crc = CHECKSUMS[checksum]
+                self.sink.adopt(file_size, version, self.mss, offset)
+                self.expected_seq_num = self.sink.next_expected(self.mss)
+            self.send_start(client_socket, server_address)
+            return False
+        if self.mss is None:
+            # Data before any handshake reply reached us
+            return False
+        self.data_seen = True
+
+        if end and seq_num != self.expected_seq_num:
+            # The end packet overtook missing data; its payload is the
+            # digest, not file data, so just ask for the gap again
+            self.send_ack(client_socket, server_address, self.expected_seq_num)
+            return False
+
+        if end:
+            # Every byte is in: check the file against the sender's digest
+            if self.repairing:
+                self.sink.rehash()
+            bad_blocks = self.sink.digest.mismatched_blocks(data)
+            if bad_blocks:
+                self.request_repair(client_socket, server_address, bad_blocks)
+                return False
+            if self.corrupted:
+                logging.warning(f"Dropped {self.corrupted} corrupted segments")
+            # Handle end of transmission once every byte is in
+            self.sink.finish()
+            self.send_ack(client_socket, server_address, -1)
+            # logging.info("End of transmission received")
+            return True
+
+        if seq_num < self.expected_seq_num:
+            # Duplicate packet received
+            self.duplicate_ack_count[seq_num] += 1
+            # logging.info(f"Duplicate packet {seq_num} received ({self.duplicate_ack_count[seq_num]} times)")
+
+            # Send duplicate ACK
+            self.send_ack(client_socket, server_address, self.expected_seq_num)
+            return False
+
+        # Write the packet at its offset, even if it is out of order
+        self.sink.write(seq_num, data)
+        # logging.info(f"Writing packet {seq_num} to file")
+        next_expected = self.sink.next_expected(self.mss)
+        if next_expected > self.expected_seq_num:
+            # In-order packet filled the gap
+            self.expected_seq_num = next_expected
+            self.duplicate_ack_count.clear()  # Reset duplicate ACK count
+
+        # Send cumulative ACK (a duplicate one if this was out of order)
+        self.send_ack(client_socket, server_address, self.expected_seq_num)
+        if self.progress:
+            self.report_progress()
+        return False
+
+    def request_repair(self, client_socket, server_address, bad_blocks):
+        """Forget the blocks whose CRC differs from the sender's and fetch
+        only those again"""
+        logging.warning(
+            f"File digest mismatch, fetching {len(bad_blocks)} blocks again"
+        )
+        for index in bad_blocks:
+            start, end = self.sink.digest.block_range(index)
+            # Whole segments, the only unit the sender resends
+            mss = self.mss
+            self.sink.forget(start // mss * mss, -(-end // mss) * mss)
+        self.repairing = True
+        self.expected_seq_num = self.sink.next_expected(self.mss)
+        self.send_ack(client_socket, server_address, self.expected_seq_num)
+
+    def report_progress(self):
+        """Print how much of the file is in, at most every PROGRESS_INTERVAL"""
+        now = time.monotonic()
+        if now < self.next_report:
+            return
+        self.next_report = now + PROGRESS_INTERVAL
+        received, size = self.sink.contiguous_end(), self.sink.size
+        percent = 100 * received / size if size else 100.0
+        print(f"Received {received}/{size} bytes ({percent:.0f}%)", file=sys.stderr)
+
+    def linger(self, client_socket, server_address):
+        """Stay behind after the transfer, like TCP's TIME_WAIT, and ACK the
+        end packet again whenever the server repeats it because our ACK of
+        it was lost; otherwise the server would retransmit it until it gave
+        up on us. The wait happens in a forked child, so the client itself
+        exits (and its completion time is measured) straight away.
+        """
+        forked = hasattr(os, "fork")
+        if forked:
+            if os.fork():
+                return
+            # Leave the parent's output alone, so nothing waits on us
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in range(3):
+                os.dup2(devnull, fd)
+        try:
+            deadline = time.monotonic() + LINGER
+            while (remaining := deadline - time.monotonic()) > 0:
+                client_socket.settimeout(remaining)
+                try:
+                    packet, _ = client_socket.recvfrom(self.max_mss + HEADER_SIZE)
+                    flags, _, _, _ = parse_packet(packet)
+                except (socket.timeout, ProtocolError):
+                    continue
+                if flags & FLAG_END:
+                    self.send_ack(client_socket, server_address, -1)
+        finally:
+            if forked:
+                os._exit(0)
+
+    def handle_timeout(self, client_socket, server_address):
+        if not self.data_seen:
+            # Nothing arrived yet, the connection request (or our
+            # confirmation of the segment size) may be lost
+            self.send_start(client_socket, server_address)
+            return
+        # logging.warning("Timeout occurred, resending ACK")
+        # Resend ACK for the last in-order packet received
+        self.send_ack(client_socket, server_address, self.expected_seq_num)
+
+    def receive_file(self, server_ip, server_port, output_file, stripe=None):
+        """Fetch the file, or with ``stripe`` (index, count) one stripe of
+        it into a file shared with the other stripes"""
+        client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client_socket.settimeout(TIMEOUT)
+        server_address = (server_ip, server_port)
+        # logging.info(f"Connecting to server at {server_address}")
+
+        checkpoint = Checkpoint(checkpoint_path(output_file, stripe))
+        shared = stripe is not None
+        try:
+            with FileSink(output_file, True, checkpoint, shared) as self.sink:
+                self.send_start(client_socket, server_address)
+
+                while True:
+                    try:
+                        # Room for the largest probe the server may send
+                        packet, _ = client_socket.recvfrom(self.max_mss + HEADER_SIZE)
+                        if self.handle_packet(client_socket, server_address, packet):
+                            break
+                    except socket.timeout:
+                        self.handle_timeout(client_socket, server_address)
+            self.linger(client_socket, server_address)
+        finally:
+            client_socket.close()
+        # logging.info("File transfer completed")
+
+    def receive_file_async(self, server_ip, server_port, output_file):
+        """Same transfer as receive_file, driven by an asyncio event loop"""
+        checkpoint = Checkpoint(checkpoint_path(output_file))
+        with FileSink(output_file, digest=True, checkpoint=checkpoint) as self.sink:
+            asyncio.run(receive(self, (server_ip, server_port), TIMEOUT))
+
+
+def main(description):
+    """Command line shared by p2_client.py and p3_client.py."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("server_ip", help="IP address of the server")
+    parser.add_argument("server_port", type=int, help="Port number of the server")
+    parser.add_argument(
+        "--pref_outfile", help="Preferred output file", default=OUTPUT_FILE
+    )
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        help="Run the transfer on an asyncio event loop",
+    )
+    parser.add_argument(
+        "--max_mss",
+        type=int,
+        default=MAX_MSS,
+        help=f"Largest segment size to accept (default {MAX_MSS}, jumbo frames)",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=0,
+        help="Segments to let the server start with at most (default: its choice)",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Report how much of the file has arrived on stderr",
+    )
+    parser.add_argument(
+        "--stripes",
+        type=int,
+        default=1,
+        help="Fetch the file as this many stripes in parallel, from consecutive "
+        "ports starting at server_port (the server needs the same --stripes)",
+    )
+    parser.add_argument(
+        "--directory",
+        help="Receive a session of many files into this directory instead of "
+        "one file (the server needs --directory too)",
+    )
+    args = parser.parse_args()
+    if args.stripes > 1 and args.asyncio:
+        parser.error("--stripes runs one process per stripe, not --asyncio")
+    if args.directory and (args.stripes > 1 or args.asyncio):
+        parser.error("--directory receives one session, not --stripes or --asyncio")
+    client_args = (args.max_mss, args.window, args.progress)
+    client = Receiver(*client_args)
+    start_time = time.time()
+    try:
+        if args.directory:
+            receive_session(client, args.server_ip, args.server_port, args.directory)
+        elif args.stripes > 1:
+            receive_striped(
+                Receiver,
+                client_args,
+                args.server_ip,
+                args.server_port,
+                args.pref_outfile,
+                args.stripes,
+            )
+        elif args.asyncio:
+            client.receive_file_async(
+                args.server_ip, args.server_port, args.pref_outfile
+            )
+        else:
+            client.receive_file(args.server_ip, args.server_port, args.pref_outfile)
+    except ProtocolError as e:
+        # The server speaks another version or reset us: nothing to retry
+        sys.exit(f"Transfer failed: {e}")
+    end_time = time.time()
+    print(end_time - start_time)
@@ -0,0 +1,46 @@
+"""Jacobson/Karels retransmission timer (RFC 6298)."""
+
+
+class RTTManager:
+    def __init__(self):
+        # Initial values
+        self.srtt = None  # Smoothed Round Trip Time
+        self.rttvar = None  # Round Trip Time Variation
+        self.rto = 1.0  # Initial RTO of 1 second
+
+        # Constants for RTT calculation (as per RFC 6298)
+        self.ALPHA = 0.125  # Smoothing factor for SRTT
+        self.BETA = 0.25  # Smoothing factor for RTTVAR
+        self.K = 4  # Factor for RTO calculation
+        self.MIN_RTO = 0.2  # Minimum RTO value (200ms)
+        self.MAX_RTO = 60  # Maximum RTO value (60 seconds)
+
+    def update_rtt(self, measured_rtt):
+        """Update SRTT, RTTVAR, and RTO based on new RTT measurement"""
+        if self.srtt is None:
+            # First RTT measurement
+            self.srtt = measured_rtt
+            self.rttvar = measured_rtt / 2
+        else:
+            # Update RTTVAR and SRTT as per Jacobson's algorithm
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(
+                self.srtt - measured_rtt
+            )
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * measured_rtt
+
+        # Calculate new RTO
+        self.rto = self.srtt + max(self.K * self.rttvar, 0.2)
+
+        # Bound RTO to reasonable values
+        self.rto = max(self.MIN_RTO, min(self.MAX_RTO, self.rto))
+
+        return self.rto
+
+    def get_timeout(self):
+        """Get current timeout value"""
+        return self.rto
+
+    def handle_timeout(self):
+        """Double the RTO on timeout (exponential backoff)"""
+        self.rto = min(self.MAX_RTO, self.rto * 2)
+        return self.rto
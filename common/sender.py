@@ -0,0 +1,690 @@
+"""Window-based sender shared by the congestion-controlled servers.
+
+The engine owns everything that does not depend on the algorithm: the
+send loop, SACK scoreboard, retransmission timers, duplicate-ACK
+detection and RTT sampling. Growing and shrinking the window is left to a
+controller from common.cc, picked by name. The segment size is whatever
+the connection's handshake (common.handshake) negotiated.
+"""
+
+import argparse
+import asyncio
+import heapq
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+from common import aio, cc
+from common.cc.trace import open_trace
+from common.intervals import IntervalSet
+from common.metrics import Metrics, MetricsServer
+from common.handshake import (
+    IDLE_TIMEOUT,
+    INITIAL_WINDOW,
+    MAX_MSS,
+    Handshake,
+    enable_pmtu_probing,
+)
+from common.packet import (
+    CHECKSUMS,
+    FLAG_ACK,
+    FLAG_END,
+    FLAG_REPAIR,
+    FLAG_START,
+    HEADER_SIZE,
+    parse_packet,
+    parse_sack,
+    send_packet,
+)
+from common.rtt import RTTManager
+from common.pacing import Pacer, PacingStats
+from common.server import serve
+from common.session import SessionSource
+from common.source import FileSource
+from common.timers import RetransmitTimers
+
+DUP_ACK_THRESHOLD = 3
+PACING_BURST = 4  # Segments a pacer may send back to back
+
+
+class Sender:
+    """Sender state for one client, driven by the shared serve() loop."""
+
+    def __init__(
+        self,
+        server_socket,
+        client_address,
+        source,
+        mss,
+        controller,
+        start_info,
+        trace=None,
+        pacer=None,
+        crc=None,
+        stats=None,
+    ):
+        self.server_socket = server_socket
+        self.client_address = client_address
+        self.source = source
+        self.mss = mss  # Negotiated by the handshake
+        self.start_info = start_info  # Handshake reply, resent on request
+        self.crc = crc  # Negotiated per-segment checksum function, if any
+        self.max_seq = source.end_seq(mss)
+        self.base_seq = 0
+        self.next_seq = 0  # One past the highest segment sent so far
+        self.packet_times = {}
+        self.timers = RetransmitTimers()  # Per-segment retransmission deadlines
+        self.lost = []  # Heap of segments waiting to be retransmitted
+        self.retransmitted = set()  # Sent more than once, so never RTT samples
+        self.sacked = IntervalSet()  # SACK scoreboard: ranges held above base_seq
+        self.delivered = 0  # Bytes the client held, as of the last ACK
+        self.rtt_manager = RTTManager()
+        self.last_ack_time = time.monotonic()
+        self.last_heard = self.last_ack_time  # Any datagram from the client
+        self.last_timeout = 0.0
+        self.done = False
+
+        self.cc = controller
+        self.trace = trace  # Trace recording every controller event, if any
+        self.duplicate_acks = 0
+        self.in_fast_recovery = False
+        self.pacer = pacer if pacer is not None else Pacer(PACING_BURST * mss)
+        self.release_time = None  # When the pacer lets the next segment out
+        self.stats = stats  # ConnectionStats for the metrics endpoint, if any
+
+    def send_start_info(self):
+        send_packet(
+            self.server_socket, self.client_address, 0, self.start_info, start=True
+        )
+
+    def start(self):
+        # A resumed download starts out with what the client already holds
+        self.delivered = self.base_seq + self.sacked.total()
+        # Record the negotiated initial window; the first flush sends it
+        self.record("open", time.monotonic())
+
+    def on_packet(self, ack_packet):
+        self.last_heard = time.monotonic()
+        flags, _, ack_seq_num, payload = parse_packet(ack_packet)
+        if flags & FLAG_START:
+            if not flags & FLAG_ACK:
+                # Client missed our handshake reply and is asking again;
+                # late confirmations of other probes are simply dropped
+                self.send_start_info()
+            return
+
+        receive_time = self.last_ack_time = time.monotonic()
+        if flags & FLAG_END:
+            self.finish()
+            return
+        for start, end in parse_sack(payload):
+            self.sacked.add(start, end)
+
+        if flags & FLAG_REPAIR and ack_seq_num < self.base_seq:
+            self.repair(ack_seq_num)
+        elif ack_seq_num > self.base_seq:
+            rtt = self.sample_rtt(ack_seq_num, receive_time)
+            acked = ack_seq_num - self.base_seq
+            self.base_seq = ack_seq_num
+            self.sacked.discard_below(self.base_seq)
+            self.handle_new_ack(acked, ack_seq_num, receive_time, rtt)
+        elif ack_seq_num == self.base_seq:
+            self.handle_duplicate_ack(receive_time)
+        else:
+            # An older ACK overtaken by a newer one: only its SACK blocks are
+            # news, and counting it as a duplicate could start a spurious
+            # fast recovery
+            self.sacked.discard_below(self.base_seq)
+
+    def finish(self):
+        self.done = True
+        if self.stats is not None:
+            self.stats.close()
+
+    def skip_ahead(self, offset, held):
+        """Resume a download the client partly holds from an earlier run.
+
+        It has everything below ``offset`` and the ``held`` ranges beyond
+        it. Both are trimmed to whole segments, exactly as the client trims
+        them, and the held ranges then stand in for SACK blocks: sending
+        starts past the highest of them, with the holes below queued as
+        lost.
+        """
+        mss = self.mss
+        self.base_seq = self.next_seq = min(offset // mss * mss, self.max_seq)
+        for start, end in held:
+            start = -(-start // mss) * mss
+            if end < self.source.size:
+                end = end // mss * mss
+            self.sacked.add(start, end)
+        self.sacked.discard_below(self.base_seq)
+        if self.sacked:
+            self.next_seq = min(-(-self.sacked.max_end() // mss) * mss, self.max_seq)
+            self.mark_holes_lost()
+
+    def newly_delivered(self, now):
+        """Report the bytes this ACK newly delivered, cumulatively or by SACK,
+        to the controller, ahead of any other hook; returns them."""
+        delivered = self.base_seq + self.sacked.total()
+        newly = max(0, delivered - self.delivered)
+        self.delivered = delivered
+        if newly:
+            self.cc.on_delivered(newly, now)
+        return newly
+
+    def handle_new_ack(self, acked, ack_seq_num, now, rtt):
+        delivered = self.newly_delivered(now)
+        if self.in_fast_recovery:
+            self.in_fast_recovery = False
+            self.cc.on_recovery_end(now)
+            self.record("recovery_end", now, delivered=delivered)
+        else:
+            srtt = self.rtt_manager.srtt
+            self.cc.on_ack(acked, now, rtt, srtt, ack_seq_num, self.next_seq)
+            self.record("ack", now, acked, rtt, srtt, ack_seq_num, delivered)
+        self.duplicate_acks = 0
+
+    def handle_duplicate_ack(self, now):
+        delivered = self.newly_delivered(now)
+        self.duplicate_acks += 1
+        if self.duplicate_acks == DUP_ACK_THRESHOLD and not self.in_fast_recovery:
+            self.cc.on_loss(now)
+            self.in_fast_recovery = True
+            self.record("loss", now, delivered=delivered)
+            if self.stats is not None:
+                self.stats.fast_recoveries += 1
+            # Resend the holes from base_seq
+            self.mark_holes_lost()
+        elif delivered:
+            # Only SACKed data arrived; traced so a replay sees it too
+            self.record("sack", now, delivered=delivered)
+
+    def record(self, event, now, acked=0, rtt=None, srtt=None, ack_seq=0, delivered=0):
+        if self.trace is not None:
+            self.trace.record(
+                self.client_address,
+                event,
+                now,
+                acked,
+                delivered,
+                rtt,
+                srtt,
+                ack_seq,
+                self.next_seq,
+                self.cc,
+            )
+
+    def mark_holes_lost(self):
+        """Queue base_seq and every unSACKed hole above it for retransmission.
+
+        Segments the client has SACKed stay put, so only the holes go out
+        again instead of the whole window.
+        """
+        self.mark_lost(self.base_seq)
+        for seq in range(self.base_seq + self.mss, self.sacked.max_end(), self.mss):
+            if seq not in self.sacked:
+                self.mark_lost(seq)
+
+    def repair(self, ack_seq_num):
+        """The client's file digest disagreed with ours and it dropped the
+        blocks that differ: resend whatever it no longer holds from
+        ``ack_seq_num`` on, then the end packet with the digest again.
+
+        Corruption says nothing about congestion, so the window is left as
+        it is. Past the last SACK block the client may hold more than it
+        could report, but everything there is resent to be safe.
+        """
+        logging.info(
+            f"{self.client_address[0]}:{self.client_address[1]} failed the "
+            f"digest check, repairing from {ack_seq_num}"
+        )
+        if self.stats is not None:
+            self.stats.repairs += 1
+        self.base_seq = ack_seq_num
+        self.delivered = self.base_seq + self.sacked.total()
+        self.duplicate_acks = 0
+        self.in_fast_recovery = False
+        self.mark_holes_lost()
+        first = max(self.base_seq + self.mss, self.sacked.max_end())
+        first = -(-first // self.mss) * self.mss
+        for seq in range(first, self.max_seq + self.mss, self.mss):
+            self.mark_lost(seq)
+
+    def mark_lost(self, seq):
+        self.timers.cancel(seq)
+        heapq.heappush(self.lost, seq)
+
+    def sample_rtt(self, ack_seq_num, receive_time):
+        """Feed the RTT estimator from packet_times, following Karn's rule.
+
+        The ACK is timed against the newest segment it covers, and no sample
+        is taken if any covered segment was retransmitted, since the ACK
+        could then belong to either copy. Returns the sample, or None.
+        """
+        sent_time = self.packet_times.get(ack_seq_num - self.mss)
+        ambiguous = False
+        for seq in range(self.base_seq, ack_seq_num, self.mss):
+            self.packet_times.pop(seq, None)
+            self.timers.cancel(seq)
+            if seq in self.retransmitted:
+                self.retransmitted.discard(seq)
+                ambiguous = True
+        if sent_time is None or ambiguous:
+            return None
+        measured_rtt = receive_time - sent_time
+        self.rtt_manager.update_rtt(measured_rtt)
+        return measured_rtt
+
+    def deadline(self):
+        """Monotonic time at which check_timeout next has work to do"""
+        deadline = min(self.rto_deadline(), self.last_heard + IDLE_TIMEOUT)
+        if self.release_time is not None:
+            return min(self.release_time, deadline)
+        return deadline
+
+    def rto_deadline(self):
+        deadline = self.timers.next_deadline()
+        if deadline is None:
+            # Nothing in flight: fall back to an idle timer so a window that
+            # has shrunk to nothing still gets reopened
+            return self.last_ack_time + self.rtt_manager.get_timeout()
+        return deadline
+
+    def check_timeout(self, now):
+        if now >= self.last_heard + IDLE_TIMEOUT:
+            # The client has died, or it finished and every ACK of our end
+            # packet was lost: retransmitting to it would go on forever
+            logging.warning(
+                f"Giving up on {self.client_address[0]}:{self.client_address[1]}, "
+                f"silent for {IDLE_TIMEOUT:.0f}s"
+            )
+            self.finish()
+            return
+        if self.release_time is not None and now >= self.release_time:
+            self.send_window()
+        if now < self.rto_deadline():
+            return
+        expired = self.timers.pop_expired(now)
+        lost = [
+            seq for seq in expired if seq >= self.base_seq and seq not in self.sacked
+        ]
+        if expired and not lost:
+            return
+        # Segments sent before the last timeout belong to the loss episode
+        # that already collapsed the window; only fresh ones back off again
+        if not lost or any(self.packet_times[seq] > self.last_timeout for seq in lost):
+            # logging.info("Timeout detected")
+            self.cc.on_timeout(now)
+            self.in_fast_recovery = False
+            self.duplicate_acks = 0
+            self.record("timeout", now)
+            if self.stats is not None:
+                self.stats.timeouts += 1
+            self.rtt_manager.handle_timeout()  # Exponential backoff
+            self.last_timeout = now
+        self.last_ack_time = now
+        for seq in lost:
+            heapq.heappush(self.lost, seq)
+        self.send_window()
+
+    def transmit(self, seq, now):
+        end = seq == self.max_seq
+        if end:
+            # Every segment has gone out once, so the digest is complete
+            self.source.hash_through(self.max_seq)
+            data = self.source.digest.pack()
+        else:
+            if seq >= self.next_seq:
+                self.source.hash_through(seq + self.mss)
+            data = self.source.segment(seq, self.mss)
+        send_packet(
+            self.server_socket, self.client_address, seq, data, end=end, crc=self.crc
+        )
+        if self.stats is not None:
+            self.stats.bytes_sent += HEADER_SIZE + len(data)
+            self.stats.segments_sent += 1
+            if seq < self.next_seq:
+                self.stats.retransmits += 1
+        self.pacer.consume(len(data), now)
+        self.packet_times[seq] = now
+        self.timers.arm(seq, now + self.rtt_manager.get_timeout())
+        if seq < self.next_seq:
+            self.retransmitted.add(seq)
+
+    def send_window(self):
+        # Calculate window size in terms of packets
+        mss = self.mss
+        current_window = max(int(self.cc.cwnd / mss), 1)  # Ensure at least 1 packet
+        window_end = min(self.base_seq + current_window * mss, self.max_seq + mss)
+        if self.stats is not None:
+            self.stats.cwnd = self.cc.cwnd
+            self.stats.ssthresh = self.cc.ssthresh
+            self.stats.srtt = self.rtt_manager.srtt
+
+        now = time.monotonic()
+        self.release_time = None
+        self.pacer.set_rate(self.pacing_rate(), now)
+        # Retransmissions first, lowest sequence first. Stale entries (since
+        # ACKed, SACKed or already resent) are dropped as they surface
+        while self.lost and self.lost[0] < window_end:
+            if self.paced_out(now):
+                return
+            seq = heapq.heappop(self.lost)
+            if seq < self.base_seq or seq in self.sacked or seq in self.timers:
+                continue
+            self.transmit(seq, now)
+        # Then new data up to the window edge
+        while self.next_seq < window_end:
+            if self.paced_out(now):
+                return
+            self.transmit(self.next_seq, now)
+            self.next_seq += mss
+        self.pacer.idle()
+
+    def pacing_rate(self):
+        """Bytes per second to pace at, or None to send as the window opens"""
+        rate = self.cc.pacing_rate
+        srtt = self.rtt_manager.srtt
+        if rate is None and self.pacer.pace_window and srtt:
+            rate = self.cc.cwnd / srtt
+        return rate
+
+    def paced_out(self, now):
+        """True if the pacer holds the next segment back; sets release_time"""
+        wait = self.pacer.delay(self.mss, now)
+        if wait > 0:
+            self.release_time = now + wait
+            return True
+        return False
+
+
+def new_sender(
+    source,
+    cc_name,
+    trace,
+    pacing,
+    pacing_burst,
+    stats,
+    max_mss,
+    initial_window,
+    metrics=None,
+):
+    """Connection factory for serve(): one handshake, then Sender, per client"""
+
+    def connection(server_socket, client_address):
+        def connect(mss, window, checksum, start_info):
+            return Sender(
+                server_socket,
+                client_address,
+                source,
+                mss,
+                cc.create(cc_name, mss, window),
+                start_info,
+                trace,
+                Pacer(pacing_burst * mss, pacing, stats),
+                CHECKSUMS[checksum],
+                metrics.open(client_address) if metrics is not None else None,
+            )
+
+        return Handshake(
+            server_socket, client_address, source, max_mss, initial_window, connect
+        )
+
+    return connection
+
+
+def open_source(path, stripe=None):
+    """The file (or stripe of it) to send, or a session of a directory."""
+    if os.path.isdir(path):
+        return SessionSource(path)
+    return FileSource(path, stripe)
+
+
+def send_file(
+    server_ip,
+    server_port,
+    file_path,
+    cc_name,
+    serve_forever=False,
+    trace=None,
+    pacing=False,
+    pacing_burst=PACING_BURST,
+    max_mss=MAX_MSS,
+    initial_window=INITIAL_WINDOW,
+    stripe=None,
+    metrics=None,
+):
+    """Serve ``file_path`` to every client with the ``cc_name`` controller.
+
+    Each client first settles its segment size and initial window with a
+    Handshake. With a ``stripe`` (index, count), only that stripe of the
+    file is served (see common.stripes); a directory is served as a
+    session of all its files (see common.session). Every connection keeps
+    its statistics in ``metrics``, a common.metrics.Metrics, if one is
+    given. Returns the PacingStats of all transfers and the DrainStats of
+    the socket.
+    """
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.bind((server_ip, server_port))
+    enable_pmtu_probing(server_socket)
+    # logging.info(f"Server listening on {server_ip}:{server_port}")
+
+    stats = PacingStats()
+    # Every client reads from the same mapping of the file
+    with open_source(file_path, stripe) as source:
+        connection = new_sender(
+            source,
+            cc_name,
+            trace,
+            pacing,
+            pacing_burst,
+            stats,
+            max_mss,
+            initial_window,
+            metrics,
+        )
+        drain = serve(
+            server_socket,
+            lambda client_address: connection(server_socket, client_address),
+            serve_forever,
+        )
+    server_socket.close()
+    logging.info(f"Pacing: {stats}")
+    return stats, drain
+
+
+def send_file_async(
+    server_ip,
+    server_port,
+    file_path,
+    cc_name,
+    serve_forever=False,
+    trace=None,
+    pacing=False,
+    pacing_burst=PACING_BURST,
+    max_mss=MAX_MSS,
+    initial_window=INITIAL_WINDOW,
+    stripe=None,
+    metrics=None,
+):
+    """Same service as send_file, driven by an asyncio event loop"""
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.bind((server_ip, server_port))
+    enable_pmtu_probing(server_socket)
+
+    stats = PacingStats()
+    with open_source(file_path, stripe) as source:
+        drain = asyncio.run(
+            aio.serve(
+                server_socket,
+                new_sender(
+                    source,
+                    cc_name,
+                    trace,
+                    pacing,
+                    pacing_burst,
+                    stats,
+                    max_mss,
+                    initial_window,
+                    metrics,
+                ),
+                serve_forever,
+            )
+        )
+    server_socket.close()
+    logging.info(f"Pacing: {stats}")
+    return stats, drain
+
+
+def add_arguments(parser, default_cc):
+    """Options every congestion-controlled server takes."""
+    parser.add_argument("server_ip", help="IP address of the server")
+    parser.add_argument("server_port", type=int, help="Port number of the server")
+    parser.add_argument(
+        "--cc",
+        choices=sorted(cc.ALGORITHMS),
+        default=default_cc,
+        help=f"Congestion control algorithm (default {default_cc})",
+    )
+    parser.add_argument(
+        "--serve_forever",
+        action="store_true",
+        help="Keep serving new clients instead of exiting after the transfers",
+    )
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        help="Run the transfers on an asyncio event loop",
+    )
+    parser.add_argument(
+        "--trace",
+        help="Record every congestion-control event to this file, as CSV, "
+        "or as compact binary records if it ends in .bin",
+    )
+    parser.add_argument(
+        "--pacing",
+        action="store_true",
+        help="Pace every algorithm at cwnd / srtt (BBR always paces itself)",
+    )
+    parser.add_argument(
+        "--pacing_burst",
+        type=int,
+        default=PACING_BURST,
+        help=f"Segments the pacer may send back to back (default {PACING_BURST})",
+    )
+    parser.add_argument(
+        "--max_mss",
+        type=int,
+        default=MAX_MSS,
+        help=f"Largest segment size to probe for (default {MAX_MSS}, jumbo frames)",
+    )
+    parser.add_argument(
+        "--initial_window",
+        type=int,
+        default=INITIAL_WINDOW,
+        help=f"Initial window in segments, capped by the client's (default {INITIAL_WINDOW})",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print achieved against target pacing rate, and how many ACKs each "
+        "socket wakeup drained, when the server exits",
+    )
+    parser.add_argument(
+        "--stripes",
+        type=int,
+        default=1,
+        help="Split the file into this many stripes, each served by its own "
+        "process on consecutive ports starting at server_port",
+    )
+    parser.add_argument(
+        "--directory",
+        help="Send every file under this directory in one session instead of "
+        "the usual file",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Serve live per-connection statistics in Prometheus text format "
+        "over HTTP, on a [HOST:]PORT or a Unix socket path",
+    )
+
+
+def serve_striped(args, file_path):
+    """Serve each of ``args.stripes`` stripes from its own process and port,
+    so a striped transfer spreads over as many cores as flows."""
+    workers = [
+        multiprocessing.Process(
+            target=run_server, args=(args, file_path, (index, args.stripes))
+        )
+        for index in range(args.stripes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def run_server(args, file_path, stripe=None):
+    """Serve the file (or one stripe of it) as the command line asks."""
+    server_port, trace_path = args.server_port, args.trace
+    metrics_address = args.metrics
+    if stripe is not None:
+        index, _ = stripe
+        server_port += index
+        if trace_path:
+            # One trace per stripe, since every stripe is its own process
+            root, ext = os.path.splitext(trace_path)
+            trace_path = f"{root}.stripe{index}{ext}"
+        if metrics_address:
+            # Likewise one endpoint per stripe: the next port, or its own socket
+            host, _, port = metrics_address.rpartition(":")
+            if port.isdigit():
+                metrics_address = f"{host}:{int(port) + index}".lstrip(":")
+            else:
+                metrics_address = f"{metrics_address}.stripe{index}"
+    trace = open_trace(trace_path) if trace_path else None
+    metrics = metrics_server = None
+    if metrics_address:
+        metrics = Metrics()
+        metrics_server = MetricsServer(metrics_address, metrics)
+    run = send_file_async if args.asyncio else send_file
+    try:
+        stats, drain = run(
+            args.server_ip,
+            server_port,
+            file_path,
+            args.cc,
+            args.serve_forever,
+            trace,
+            args.pacing,
+            args.pacing_burst,
+            args.max_mss,
+            args.initial_window,
+            stripe,
+            metrics,
+        )
+        if args.stats:
+            print(stats)
+            print(f"ACK draining: {drain}")
+    finally:
+        if trace is not None:
+            trace.close()
+        if metrics_server is not None:
+            metrics_server.close()
+
+
+def main(description, default_cc, file_path):
+    """Command line shared by p2_server.py and p3_server.py."""
+    parser = argparse.ArgumentParser(description=description)
+    add_arguments(parser, default_cc)
+    args = parser.parse_args()
+    if args.directory:
+        if args.stripes > 1:
+            parser.error("--directory sends one session, not --stripes")
+        file_path = args.directory
+    if args.stripes > 1:
+        serve_striped(args, file_path)
+    else:
+        run_server(args, file_path)
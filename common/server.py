@@ -0,0 +1,154 @@
+import logging
+import select
+import time
+
+from common.packet import (
+    FLAG_START,
+    LEGACY_JSON_MARKER,
+    ProtocolError,
+    create_reset,
+    parse_packet,
+)
+
+RECV_SIZE = 2048
+TICK = 0.01  # Longest a loop waits before checking connection deadlines
+
+
+class DrainStats:
+    """How many datagrams each socket wakeup drained in one batch."""
+
+    def __init__(self):
+        self.wakeups = 0
+        self.datagrams = 0
+        self.largest = 0
+
+    def record(self, batch):
+        self.wakeups += 1
+        self.datagrams += batch
+        self.largest = max(self.largest, batch)
+
+    def mean(self):
+        return self.datagrams / self.wakeups if self.wakeups else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.datagrams} datagrams over {self.wakeups} wakeups "
+            f"(mean batch {self.mean():.1f}, largest {self.largest})"
+        )
+
+
+class Demux:
+    """Routes datagrams to per-client connection state by source address.
+
+    ``new_connection(client_address)`` builds the state when a start packet
+    arrives from an unknown address. Connections provide ``start(packet)``,
+    which is handed that start packet,
+    ``on_packet(packet)`` (which only updates state), ``send_window()``,
+    ``deadline()``, ``check_timeout(now)`` and a ``done`` flag; deadlines
+    and ``now`` are on the ``time.monotonic()`` clock.
+    """
+
+    def __init__(self, sender, new_connection):
+        self.sender = sender  # Anything with sendto(), used for resets
+        self.new_connection = new_connection
+        self.connections = {}
+        self.served = False
+
+    def dispatch(self, packet, client_address, touched):
+        """Apply one datagram; connections it changed are added to ``touched``."""
+        connection = self.connections.get(client_address)
+        try:
+            if connection is not None:
+                connection.on_packet(packet)
+                touched[client_address] = connection
+                return
+            flags, _, _, _ = parse_packet(packet)
+            if flags & FLAG_START:
+                # logging.info(f"New client {client_address}")
+                accepted = self.new_connection(client_address)
+                accepted.start(packet)
+                self.connections[client_address] = accepted
+                self.served = True
+                touched[client_address] = accepted
+        except ProtocolError as e:
+            logging.warning(f"Rejecting {client_address}: {e}")
+            if connection is None and packet and packet[0] != LEGACY_JSON_MARKER:
+                # Peers on another binary version get a reset so they fail
+                # fast; legacy JSON peers could not parse one anyway
+                self.sender.sendto(create_reset(), client_address)
+
+    def flush(self, touched):
+        """Refill the window of every touched connection, once each."""
+        for client_address, connection in touched.items():
+            if not connection.done:
+                connection.send_window()
+            if connection.done:
+                self.discard(client_address)
+
+    def sweep(self, now):
+        """Run due timers; return the earliest deadline still pending."""
+        next_deadline = None
+        for client_address, connection in list(self.connections.items()):
+            connection.check_timeout(now)
+            if connection.done:
+                self.discard(client_address)
+                continue
+            deadline = connection.deadline()
+            if next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        return next_deadline
+
+    def discard(self, client_address):
+        self.connections.pop(client_address, None)
+
+
+def serve(server_socket, new_connection, serve_forever=False):
+    """Serve many transfers from one socket, demultiplexed by client address.
+
+    The socket is non-blocking: each wakeup reads every queued datagram
+    until EAGAIN, applies them all, and only then refills the windows of
+    the connections they touched. Select wakes for the earliest connection
+    deadline (a retransmission timer or a paced send), and at least every
+    TICK. Unless ``serve_forever`` is set, the loop returns once every
+    connection it has accepted so far has finished.
+    """
+    demux = Demux(server_socket, new_connection)
+    stats = DrainStats()
+    server_socket.setblocking(False)
+    last_sweep = time.monotonic()
+    next_deadline = None
+
+    while serve_forever or not demux.served or demux.connections:
+        timeout = None
+        if demux.connections:
+            timeout = TICK
+            if next_deadline is not None:
+                timeout = min(TICK, max(0.0, next_deadline - time.monotonic()))
+        readable, _, _ = select.select([server_socket], [], [], timeout)
+
+        if readable:
+            touched = {}
+            batch = 0
+            while True:
+                try:
+                    packet, client_address = server_socket.recvfrom(RECV_SIZE)
+                except (BlockingIOError, InterruptedError):
+                    break
+                batch += 1
+                demux.dispatch(packet, client_address, touched)
+            stats.record(batch)
+            demux.flush(touched)
+            for connection in touched.values():
+                if not connection.done:
+                    deadline = connection.deadline()
+                    if next_deadline is None or deadline < next_deadline:
+                        next_deadline = deadline
+
+        now = time.monotonic()
+        due = next_deadline is not None and now >= next_deadline
+        if due or now - last_sweep >= TICK:
+            last_sweep = now
+            next_deadline = demux.sweep(now)
+
+    logging.info(f"ACK draining: {stats}")
+    return stats
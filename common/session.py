@@ -0,0 +1,205 @@
+"""Sessions: every file under a directory over one connection.
+
+The session is sent as a single stream: a manifest naming each file and
+its size, then the files back to back in manifest order. To the sender,
+handshake, digest and checkpoints it is just a file, so congestion window
+and RTT estimates carry over from one file to the next, and segments of
+small files share windows instead of each file paying its own handshake
+and slow start.
+
+The receiver spools the stream into one file next to the output directory
+and, once it is complete and verified, splits it into the files the
+manifest names.
+"""
+
+import bisect
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+
+from common.digest import READ_SIZE, FileDigest
+from common.packet import ProtocolError
+
+MAGIC = b"UDPSESS1"
+MANIFEST = struct.Struct("!8sQ")  # magic, length of the entries that follow
+ENTRY = struct.Struct("!QH")  # file size, length of its UTF-8 relative path
+SPOOL_SUFFIX = ".session"  # Of the stream being received, beside the directory
+MAX_OPEN_FILES = 64  # Files a SessionSource keeps open at once
+
+
+def pack_manifest(entries):
+    """Manifest of (relative path, size) entries, in stream order."""
+    data = b""
+    for path, size in entries:
+        name = path.encode()
+        data += ENTRY.pack(size, len(name)) + name
+    return MANIFEST.pack(MAGIC, len(data)) + data
+
+
+def parse_manifest(data):
+    """Return the (relative path, size) entries of a manifest."""
+    if len(data) < MANIFEST.size:
+        raise ProtocolError("truncated session manifest")
+    magic, length = MANIFEST.unpack_from(data)
+    if magic != MAGIC or len(data) < MANIFEST.size + length:
+        raise ProtocolError("malformed session manifest")
+    entries = []
+    position = MANIFEST.size
+    while position < MANIFEST.size + length:
+        size, name_length = ENTRY.unpack_from(data, position)
+        position += ENTRY.size
+        path = bytes(data[position : position + name_length]).decode()
+        position += name_length
+        entries.append((path, size))
+    return entries
+
+
+def output_path(directory, path):
+    """Where a manifest entry goes, refusing paths that leave ``directory``."""
+    normal = os.path.normpath(path)
+    if not path or os.path.isabs(normal) or normal.split(os.sep)[0] in ("..", "."):
+        raise ProtocolError(f"session names an unsafe path {path!r}")
+    return os.path.join(directory, normal)
+
+
+class SessionSource:
+    """Every regular file under ``directory``, as one stream to send.
+
+    Has the interface of FileSource. Files are read in place as segments
+    are sent, so starting a session copies nothing; only a handful stay
+    open at once.
+    """
+
+    def __init__(self, directory):
+        entries, mtimes = [], []
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if not os.path.isfile(path):
+                    continue
+                stat = os.stat(path)
+                entries.append((os.path.relpath(path, directory), stat.st_size))
+                mtimes.append(stat.st_mtime_ns)
+        self.manifest = pack_manifest(entries)
+        self.offset = 0
+        # Stream offset and path of every non-empty file, for lookups
+        self.starts, self.paths = [], []
+        position = len(self.manifest)
+        for path, size in entries:
+            if size:
+                self.starts.append(position)
+                self.paths.append(os.path.join(directory, path))
+            position += size
+        self.ends = self.starts[1:] + [position]
+        self.size = position
+        # Changes whenever a file is added, removed, renamed or rewritten
+        fingerprint = hashlib.sha256(self.manifest)
+        fingerprint.update(struct.pack(f"!{len(mtimes)}Q", *mtimes))
+        self.version = int.from_bytes(fingerprint.digest()[:8], "big") or 1
+        self.digest = FileDigest(self.size)
+        self.fds = OrderedDict()  # Open files by index, least recently used first
+
+    def fd(self, index):
+        fd = self.fds.pop(index, None)
+        if fd is None:
+            fd = os.open(self.paths[index], os.O_RDONLY)
+            if len(self.fds) >= MAX_OPEN_FILES:
+                os.close(self.fds.popitem(last=False)[1])
+        self.fds[index] = fd
+        return fd
+
+    def read(self, start, end):
+        """Bytes of the stream in [start, end)."""
+        pieces = []
+        if start < len(self.manifest):
+            pieces.append(self.manifest[start:end])
+            start = len(self.manifest)
+        while start < end:
+            index = bisect.bisect_right(self.starts, start) - 1
+            length = min(end, self.ends[index]) - start
+            offset = start - self.starts[index]
+            data = os.pread(self.fd(index), length, offset)
+            if len(data) != length:
+                raise OSError(f"{self.paths[index]} shrank while being sent")
+            pieces.append(data)
+            start += length
+        return b"".join(pieces)
+
+    def segment(self, seq_num, length):
+        return self.read(seq_num, min(seq_num + length, self.size))
+
+    def hash_through(self, end):
+        """Extend the digest over the stream up to ``end`` as it is first sent."""
+        end = min(end, self.size)
+        while self.digest.end < end:
+            start = self.digest.end
+            self.digest.update(self.read(start, min(start + READ_SIZE, end)))
+
+    def end_seq(self, mss):
+        """Sequence number of the end-of-data packet, one past the last segment."""
+        return -(-self.size // mss) * mss
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def copy_range(src, dst, offset, count):
+    """Copy ``count`` bytes at ``offset`` of ``src`` to the end of ``dst``,
+    inside the kernel where the platform allows it."""
+    copy_file_range = getattr(os, "copy_file_range", None)
+    while count:
+        try:
+            if copy_file_range is None:
+                raise OSError
+            copied = copy_file_range(src, dst, count, offset)
+        except OSError:
+            # Not on this platform or between these filesystems
+            copy_file_range = None
+            copied = os.write(dst, os.pread(src, min(count, READ_SIZE), offset))
+        if copied == 0:
+            raise OSError("session spool ends early")
+        offset += copied
+        count -= copied
+
+
+def unpack_session(spool, directory):
+    """Split a completely received session stream into its files."""
+    with open(spool, "rb") as f:
+        data = f.read(MANIFEST.size)
+        if len(data) == MANIFEST.size:
+            data += f.read(MANIFEST.unpack(data)[1])
+        entries = parse_manifest(data)
+        position = len(data)
+        for path, size in entries:
+            target = output_path(directory, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as out:
+                copy_range(f.fileno(), out.fileno(), position, size)
+            position += size
+    os.remove(spool)
+
+
+def spool_path(directory):
+    """Where the stream for ``directory`` is spooled: a hidden file beside it,
+    so no file the session names can overwrite it, at a fixed path so an
+    interrupted session resumes from its checkpoint."""
+    parent, name = os.path.split(os.path.abspath(directory))
+    return os.path.join(parent, f".{name}{SPOOL_SUFFIX}")
+
+
+def receive_session(client, server_ip, server_port, directory):
+    """Fetch a whole session with ``client`` and unpack it into ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    spool = spool_path(directory)
+    client.receive_file(server_ip, server_port, spool)
+    unpack_session(spool, directory)
@@ -0,0 +1,167 @@
+import os
+import time
+
+from common.digest import FileDigest
+from common.intervals import IntervalSet
+from common.packet import MAX_SACK_BLOCKS
+
+CHECKPOINT_INTERVAL = 1.0  # Seconds between syncs of the output and checkpoint
+
+
+class FileSink:
+    """Output file written segment by segment at each segment's offset.
+
+    Out-of-order segments go straight to disk with pwrite instead of being
+    held in memory; only the received byte ranges are tracked. With
+    ``digest`` set, the in-order prefix is hashed as it grows (see
+    common.digest); only data that arrived ahead of a gap is read back.
+
+    With a ``checkpoint`` (common.checkpoint), progress survives the
+    process: the output is synced and the received ranges recorded at most
+    every CHECKPOINT_INTERVAL, and a sink opened over an earlier partial
+    download keeps what it holds.
+
+    A ``shared`` sink receives one stripe of a striped transfer (see
+    common.stripes) into a file other sinks write too, so it never
+    truncates it.
+    """
+
+    def __init__(self, path, digest=False, checkpoint=None, shared=False):
+        self.checkpoint = checkpoint
+        self.resume = checkpoint.load() if checkpoint is not None else None
+        self.shared = shared
+        flags = os.O_RDWR | os.O_CREAT
+        if self.resume is None and not shared:
+            flags |= os.O_TRUNC
+        self.fd = os.open(path, flags, 0o644)
+        self.offset = 0  # Where in the file the data received goes
+        self.size = None
+        self.version = 0  # Sender's file version, recorded in checkpoints
+        self.received = IntervalSet()
+        if self.resume is not None:
+            for start, end in self.resume[2]:
+                self.received.add(start, end)
+        self.hashing = digest
+        self.digest = None
+        self.next_checkpoint = 0.0
+        self.complete = False
+
+    def preallocate(self, size):
+        """Reserve space for the whole file once the sender announces its size."""
+        if self.size is not None:
+            return
+        self.size = size
+        if self.hashing:
+            self.digest = FileDigest(size)
+        if size == 0:
+            return
+        try:
+            os.posix_fallocate(self.fd, self.offset, size)
+        except (AttributeError, OSError):
+            # Not every platform or filesystem supports fallocate
+            if os.fstat(self.fd).st_size < self.offset + size:
+                os.ftruncate(self.fd, self.offset + size)
+
+    def resume_offer(self):
+        """What to ask the sender to skip: (size, version, offset, ranges
+        held beyond offset), or None without an earlier partial download."""
+        if self.resume is None:
+            return None
+        size, version, _ = self.resume
+        offset = self.contiguous_end()
+        return (
+            size,
+            version,
+            offset,
+            self.received.ranges_after(offset, MAX_SACK_BLOCKS),
+        )
+
+    def adopt(self, size, version, mss, offset=0):
+        """Take on the file the sender announced, to be written from
+        ``offset`` on.
+
+        If it is the file an earlier run was fetching, keep what that run
+        left on disk, trimmed to whole segments of ``mss`` just like the
+        sender trims the offer; otherwise start from nothing.
+        """
+        if self.resume is not None and version and self.resume[:2] == (size, version):
+            kept = IntervalSet()
+            for start, end in self.received:
+                start = -(-start // mss) * mss
+                if end < size:
+                    end = end // mss * mss
+                kept.add(start, end)
+            self.received = kept
+        else:
+            self.received = IntervalSet()
+            if not self.shared:
+                os.ftruncate(self.fd, 0)
+        self.offset = offset
+        self.version = version
+        self.preallocate(size)
+        if self.digest is not None:
+            # The only pass over data an earlier run wrote
+            self.digest.update_from(self.fd, self.contiguous_end(), offset)
+
+    def write(self, offset, data):
+        """Write a segment at its offset; return False if it was already held."""
+        if not data or offset + len(data) <= self.received.contiguous_end(offset):
+            return False
+        os.pwrite(self.fd, data, self.offset + offset)
+        self.received.add(offset, offset + len(data))
+        if self.digest is not None and offset == self.digest.end:
+            # Next in order: hash it from memory, then whatever it joined up
+            self.digest.update(data)
+            self.digest.update_from(self.fd, self.contiguous_end(), self.offset)
+        if self.checkpoint is not None:
+            now = time.monotonic()
+            if now >= self.next_checkpoint:
+                self.next_checkpoint = now + CHECKPOINT_INTERVAL
+                self.save_checkpoint()
+        return True
+
+    def save_checkpoint(self):
+        # Data first, so the checkpoint never claims more than the disk holds
+        getattr(os, "fdatasync", os.fsync)(self.fd)
+        self.checkpoint.save(self.size, self.version, self.received)
+
+    def finish(self):
+        """The download is complete and verified; its checkpoint can go."""
+        self.complete = True
+
+    def forget(self, start, end):
+        """Drop [start, end) from the received ranges so it is fetched again."""
+        self.received.remove(start, end)
+
+    def rehash(self):
+        """Digest the whole file afresh, once repaired ranges are back in."""
+        self.digest = FileDigest(self.size)
+        self.digest.update_from(self.fd, self.size, self.offset)
+
+    def contiguous_end(self):
+        return self.received.contiguous_end(0)
+
+    def next_expected(self, mss):
+        """Cumulative ACK in segment units: offset of the first missing segment.
+
+        Only the final segment can be short, so rounding up to a multiple of
+        ``mss`` is exact once the whole file has arrived.
+        """
+        return -(-self.contiguous_end() // mss) * mss
+
+    def close(self):
+        if self.size is not None:
+            if not self.shared:
+                os.ftruncate(self.fd, self.offset + self.size)
+            if self.checkpoint is not None:
+                if self.complete:
+                    self.checkpoint.remove()
+                else:
+                    self.save_checkpoint()
+        os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,61 @@
+import mmap
+import os
+
+from common.digest import FileDigest
+from common.stripes import stripe_range
+
+
+class FileSource:
+    """Read-only memory map of the file being sent.
+
+    Segments are memoryview slices into the mapping, so nothing is copied
+    or preloaded and memory use does not grow with the file size.
+
+    With a ``stripe`` (index, count), only that stripe's range of the file
+    (see common.stripes) is sent, as if it were the whole file; ``offset``
+    is where it starts.
+    """
+
+    def __init__(self, path, stripe=None):
+        self.file = open(path, "rb")
+        stat = os.fstat(self.file.fileno())
+        self.offset, end = 0, stat.st_size
+        if stripe is not None:
+            self.offset, end = stripe_range(stat.st_size, *stripe)
+        self.size = end - self.offset
+        # Changes whenever the file is rewritten, so a client resuming a
+        # download can tell it still has parts of the same file
+        self.version = stat.st_mtime_ns
+        if self.size:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mmap)[self.offset : end]
+        else:
+            # mmap refuses empty files
+            self.mmap = None
+            self.view = memoryview(b"")
+        # Shared by every transfer of this file, so it is hashed only once
+        self.digest = FileDigest(self.size)
+
+    def segment(self, seq_num, length):
+        return self.view[seq_num : seq_num + length]
+
+    def hash_through(self, end):
+        """Extend the digest over the file up to ``end`` as it is first sent."""
+        if end > self.digest.end:
+            self.digest.update(self.view[self.digest.end : min(end, self.size)])
+
+    def end_seq(self, mss):
+        """Sequence number of the end-of-data packet, one past the last segment."""
+        return -(-self.size // mss) * mss
+
+    def close(self):
+        self.view.release()
+        if self.mmap is not None:
+            self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,54 @@
+"""Striped transfers: one file split over several flows at once.
+
+Stripe ``i`` of ``count`` is a contiguous range of the file, served by its
+own server process on port ``server_port + i`` with its own congestion
+controller, digest and retransmission state. Each stripe is an ordinary
+transfer of its range; the handshake reply tells the client where in the
+file the range starts, so every stripe receiver writes straight into the
+one output file at its own offsets.
+"""
+
+import multiprocessing
+import os
+
+STRIPE_ALIGN = 64 * 1024  # Stripes start on block boundaries
+
+
+def stripe_range(size, index, count):
+    """Byte range [start, end) of stripe ``index`` of ``count`` in a file."""
+    stride = -(-size // count)
+    stride = -(-stride // STRIPE_ALIGN) * STRIPE_ALIGN
+    start = min(index * stride, size)
+    return start, min(start + stride, size)
+
+
+def receive_stripe(client_class, client_args, server_address, output_file, stripe):
+    """Fetch one stripe in a worker process; return where its range ends."""
+    client = client_class(*client_args)
+    client.receive_file(*server_address, output_file, stripe)
+    return client.sink.offset + client.sink.size
+
+
+def receive_striped(
+    client_class, client_args, server_ip, server_port, output_file, count
+):
+    """Fetch ``count`` stripes in parallel, one process and flow each.
+
+    ``client_class(*client_args)`` builds each stripe's receiver; its
+    ``receive_file`` takes the stripe as (index, count).
+    """
+    stripes = [
+        (
+            client_class,
+            client_args,
+            (server_ip, server_port + index),
+            output_file,
+            (index, count),
+        )
+        for index in range(count)
+    ]
+    with multiprocessing.Pool(count) as pool:
+        ends = pool.starmap(receive_stripe, stripes, chunksize=1)
+    # Stripe receivers never truncate the shared file, so cut off whatever
+    # an older, longer file left past the end
+    os.truncate(output_file, max(ends))
@@ -0,0 +1,54 @@
+import heapq
+
+
+class RetransmitTimers:
+    """Per-segment retransmission deadlines in a min-heap with lazy deletion.
+
+    Arming or cancelling a segment only touches ``deadlines``; the heap
+    entry it leaves behind is dropped when it reaches the top, so expired
+    segments are found in O(expired) rather than by scanning the window.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}  # seq -> live deadline
+
+    def arm(self, seq, deadline):
+        """Set (or move) the deadline of ``seq``."""
+        self.deadlines[seq] = deadline
+        heapq.heappush(self.heap, (deadline, seq))
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.compact()
+
+    def cancel(self, seq):
+        """Disarm ``seq``; returns the deadline it had, or None."""
+        return self.deadlines.pop(seq, None)
+
+    def __contains__(self, seq):
+        return seq in self.deadlines
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def next_deadline(self):
+        """Earliest live deadline, or None if no segment is armed."""
+        heap = self.heap
+        while heap and self.deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_expired(self, now):
+        """Disarm and return every segment whose deadline is at or before ``now``."""
+        expired = []
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            deadline, seq = heapq.heappop(heap)
+            if self.deadlines.get(seq) == deadline:
+                del self.deadlines[seq]
+                expired.append(seq)
+        return expired
+
+    def compact(self):
+        """Rebuild the heap from the live deadlines, dropping stale entries."""
+        self.heap = [(deadline, seq) for seq, deadline in self.deadlines.items()]
+        heapq.heapify(self.heap)